@@ -0,0 +1,284 @@
+"""
+Throughput and latency of bot handlers on synthetic updates, fully offline
+
+Updates modeled on json/photo_upload_example.json go through the same
+update processor and handlers as in production. API calls go through the
+same rate limiter and connection pools too, only the HTTP transport under
+the pools is fake: it answers with canned results instead of Telegram.
+Limits of outbound rate are lifted, so they do not hide handler costs.
+likebot works on a database filled with `--votes` votes before the run.
+
+    python -m benchmarks.handlers likebot --updates 20000 --votes 3000000
+
+Prints one JSON line per bot.
+"""
+import argparse
+import asyncio
+import copy
+import importlib
+import itertools
+import json
+import logging
+import os
+import random
+import statistics
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, Iterator, List
+from urllib.parse import parse_qsl
+
+import httpx
+from telegram import Update
+from telegram.ext import Application, ExtBot
+
+from common.transport import application_pools
+
+BOTS = ('likebot', 'showroombot', 'templatebot')
+EXAMPLE_FILE = os.path.join(os.path.dirname(__file__), '..', 'json', 'photo_upload_example.json')
+with open(EXAMPLE_FILE) as example_file:
+    EXAMPLE: Dict[str, Any] = json.load(example_file)
+BOT_USER = {'id': 123456, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot'}
+# posts clicked during the run, most of the clicks go to a few of them
+HOT_POSTS = 100
+FORM = 'application/x-www-form-urlencoded'
+
+
+class FakeTransport(httpx.AsyncBaseTransport):
+    """ Answer every Bot API call without network and count them by method """
+
+    def __init__(self) -> None:
+        self.calls: Counter = Counter()  # type: ignore[type-arg]
+        self._ids = itertools.count(1)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        endpoint = request.url.path.rsplit('/', 1)[-1]
+        self.calls[endpoint] += 1
+        body = await request.aread()
+        parameters: Dict[str, Any] = {}
+        if request.headers.get('content-type', '').startswith(FORM):
+            parameters = dict(parse_qsl(body.decode()))
+        result = self._result(endpoint, parameters)
+        return httpx.Response(200, json={'ok': True, 'result': result})
+
+    def _result(self, endpoint: str, parameters: Dict[str, Any]) -> Any:
+        if endpoint == 'getMe':
+            return BOT_USER
+        if not endpoint.startswith('send') and 'inline_message_id' in parameters:
+            return True
+        if not endpoint.startswith(('send', 'edit')):
+            return True
+        file_id = f'file-{next(self._ids)}'
+        media = {'file_id': file_id, 'file_unique_id': file_id}
+        message = copy.deepcopy(EXAMPLE['message'])
+        message.update(
+            message_id=next(self._ids),
+            chat={'id': int(parameters.get('chat_id', 1)), 'type': 'private'},
+            text=parameters.get('text', ''),
+            photo=[dict(media, width=320, height=168)],
+            video=dict(media, width=320, height=168, duration=1),
+            audio=dict(media, duration=1),
+            document=media,
+        )
+        return message
+
+
+def update_data(update_id: int, user_id: int, **content: Any) -> Dict[str, Any]:
+    """ Update like the recorded example, with `content` instead of photo message """
+    user = dict(EXAMPLE['message']['from'], id=user_id)
+    data: Dict[str, Any] = {'update_id': update_id}
+    if 'text' in content:
+        message = copy.deepcopy(EXAMPLE['message'])
+        del message['photo']
+        text = content['text']
+        message.update({'from': user, 'chat': dict(message['chat'], id=user_id), 'text': text})
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text)}]
+        data['message'] = message
+    elif 'query' in content:
+        data['inline_query'] = {
+            'id': str(update_id), 'from': user, 'query': content['query'], 'offset': ''
+        }
+    else:
+        callback = {
+            'id': str(update_id), 'from': user, 'chat_instance': '1', 'data': content['data']
+        }
+        if 'inline_message_id' in content:
+            callback['inline_message_id'] = content['inline_message_id']
+        else:
+            message = copy.deepcopy(EXAMPLE['message'])
+            message.update({'chat': dict(message['chat'], id=user_id), 'from': BOT_USER})
+            callback['message'] = message
+        data['callback_query'] = callback
+    return data
+
+
+def make_update(bot: ExtBot, update_id: int, user_id: int, **content: Any) -> Update:
+    return Update.de_json(update_data(update_id, user_id, **content), bot)  # type: ignore
+
+
+def likebot_updates(bot: ExtBot, count: int) -> Iterator[Update]:
+    from likebot.config import LIKE_REACTIONS  # pylint: disable=import-outside-toplevel
+
+    reactions = list(LIKE_REACTIONS)
+    for update_id in range(count):
+        user_id = random.randint(1, 10 ** 6)
+        kind = random.random()
+        if kind < 0.9:
+            # hot posts get most of the clicks
+            post = min(int(random.expovariate(0.1)), HOT_POSTS - 1)
+            yield make_update(
+                bot,
+                update_id,
+                user_id,
+                inline_message_id=f'post-{post}',
+                data=random.choice(reactions),
+            )
+        elif kind < 0.97:
+            yield make_update(bot, update_id, user_id, query=f'post text {update_id % 50}')
+        else:
+            yield make_update(bot, update_id, user_id, text='/start')
+
+
+def showroombot_updates(bot: ExtBot, count: int) -> Iterator[Update]:
+    commands = ['/start', '/help', '/keyboard', '/inlinekeyboard', '/file', '/command']
+    buttons = ['like', 'dislike', 'edit', 'upload_png', 'upload_video', 'upload_audio']
+    for update_id in range(count):
+        user_id = random.randint(1, 10 ** 5)
+        if random.random() < 0.5:
+            yield make_update(bot, update_id, user_id, text=random.choice(commands))
+        else:
+            yield make_update(bot, update_id, user_id, data=random.choice(buttons))
+
+
+def templatebot_updates(bot: ExtBot, count: int) -> Iterator[Update]:
+    for update_id in range(count):
+        user_id = random.randint(1, 10 ** 5)
+        kind = random.random()
+        if kind < 0.4:
+            yield make_update(bot, update_id, user_id, text=f'hello {update_id}')
+        elif kind < 0.7:
+            yield make_update(bot, update_id, user_id, data='button')
+        elif kind < 0.9:
+            yield make_update(bot, update_id, user_id, query=f'query {update_id % 50}')
+        else:
+            yield make_update(bot, update_id, user_id, text='/start')
+
+
+UPDATES: Dict[str, Callable[[ExtBot, int], Iterator[Update]]] = {
+    'likebot': likebot_updates,
+    'showroombot': showroombot_updates,
+    'templatebot': templatebot_updates,
+}
+
+
+def prefill_votes(file_name: str, votes: int) -> None:
+    """ Spread `votes` votes over posts, ~1000 voters per post """
+    from likebot.database import LikeDatabase  # pylint: disable=import-outside-toplevel
+
+    database = LikeDatabase(file_name)
+    posts = max(votes // 1000, HOT_POSTS)
+    reactions = list(database.reactions.values())
+    database.conn.executemany(
+        'INSERT INTO message(id, inline_message_id) VALUES (?, ?)',
+        ((post + 1, f'post-{post}') for post in range(posts)),
+    )
+    database.conn.executemany(
+        'INSERT INTO vote(message_id, user_id, reaction_id) VALUES (?, ?, ?)',
+        ((n % posts + 1, n // posts, random.choice(reactions)) for n in range(votes)),
+    )
+    database.conn.commit()
+    database.close()
+
+
+def timed(name: str, callback: Any, samples: Dict[str, List[float]]) -> Any:
+    async def wrapper(update: object, context: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            return await callback(update, context)
+        finally:
+            samples[name].append(time.perf_counter() - started)
+
+    return wrapper
+
+
+def summary(samples: List[float]) -> Dict[str, float]:
+    # quantiles need at least two samples
+    percentiles = statistics.quantiles(samples * 2 if len(samples) == 1 else samples, n=100)
+    return {
+        'count': len(samples),
+        'p50_ms': round(percentiles[49] * 1000, 3),
+        'p99_ms': round(percentiles[98] * 1000, 3),
+    }
+
+
+async def run_bot(name: str, count: int) -> Dict[str, Any]:
+    module = importlib.import_module(f'{name}.bot')
+    # bots log every update on DEBUG, that is not what is measured here
+    logging.getLogger().setLevel(logging.WARNING)
+    application: Application = module.build_application()
+    transport = FakeTransport()
+    for pool in application_pools(application):
+        pool.use_transport(transport)
+    samples: Dict[str, List[float]] = defaultdict(list)
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            handler_name = getattr(handler.callback, '__qualname__', repr(handler.callback))
+            handler.callback = timed(handler_name, handler.callback, samples)
+
+    updates = list(UPDATES[name](application.bot, count))
+    # updates come from this benchmark, not from Telegram
+    application.updater = None
+    await application.initialize()
+    # e.g. rate limiter worker, it runs until shutdown
+    idle_tasks = asyncio.all_tasks()
+    processor = application.update_processor
+    started = time.perf_counter()
+    # the same way Application hands over updates received from Telegram
+    for update in updates:
+        await processor.process_update(update, application.process_update(update))
+    await processor.shutdown()
+    elapsed = time.perf_counter() - started
+    # debounced inline answers and keyboard edits are sent after handlers return
+    background = asyncio.all_tasks() - idle_tasks
+    if background:
+        await asyncio.wait(background, timeout=10)
+    await application.shutdown()
+    return {
+        'bot': name,
+        'updates': count,
+        'seconds': round(elapsed, 3),
+        'updates_per_sec': round(count / elapsed, 1),
+        'handlers': {handler: summary(values) for handler, values in sorted(samples.items())},
+        'api_calls': dict(sorted(transport.calls.items())),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('bots', nargs='*', help=f'any of {", ".join(BOTS)}, all by default')
+    parser.add_argument('--updates', type=int, default=10000)
+    parser.add_argument('--votes', type=int, default=1000000, help='votes in likebot database')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    bots = args.bots or BOTS
+    if set(bots) - set(BOTS):
+        parser.error(f'unknown bot, choose from {", ".join(BOTS)}')
+    random.seed(args.seed)
+
+    with tempfile.TemporaryDirectory() as directory:
+        # bot modules open their databases on import, so files go to temp dir first
+        os.environ['LIKE_DB_FILE_NAME'] = os.path.join(directory, 'like.db')
+        os.environ['FILE_ID_CACHE_FILE_NAME'] = os.path.join(directory, 'file_id.db')
+        os.environ.setdefault('TELEGRAM_BOT_TOKEN', f'{BOT_USER["id"]}:benchmark')
+        os.environ.setdefault('OUTBOUND_RATE', '1000000')
+        os.environ.setdefault('PRIVATE_CHAT_INTERVAL', '0')
+        os.environ.setdefault('GROUP_CHAT_INTERVAL', '0')
+        if 'likebot' in bots:
+            prefill_votes(os.environ['LIKE_DB_FILE_NAME'], args.votes)
+        for name in bots:
+            print(json.dumps(asyncio.run(run_bot(name, args.updates))), flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Cost of reaction keyboard per click: fresh objects vs cached markup
+
+    python -m benchmarks.keyboards
+"""
+import json
+import random
+import timeit
+import tracemalloc
+from typing import Callable, List, Tuple
+
+from telegram import InlineKeyboardMarkup
+
+from likebot.keyboards import get_keyboard
+
+CLICKS = 20000
+# counters seen by hot post: small set of close values
+COUNTS: List[Tuple[int, ...]] = [
+    (random.randint(100, 120), random.randint(0, 10)) for _ in range(CLICKS)
+]
+
+
+def build(counts: Tuple[int, ...]) -> InlineKeyboardMarkup:
+    return get_keyboard.__wrapped__(counts)  # type: ignore[attr-defined]
+
+
+def allocated_per_click(render: Callable[[Tuple[int, ...]], InlineKeyboardMarkup]) -> float:
+    """ Bytes allocated and kept alive by keyboards of CLICKS clicks """
+    tracemalloc.start()
+    keyboards = [render(counts) for counts in COUNTS]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del keyboards
+    return size / CLICKS
+
+
+def seconds_per_click(statement: Callable[[], object]) -> float:
+    return min(timeit.repeat(statement, number=1, repeat=3)) / CLICKS
+
+
+def main() -> None:
+    get_keyboard.cache_clear()
+    markups = [get_keyboard(counts) for counts in COUNTS]
+    results = {
+        'build_us': seconds_per_click(lambda: [build(c) for c in COUNTS]) * 1e6,
+        'cached_us': seconds_per_click(lambda: [get_keyboard(c) for c in COUNTS]) * 1e6,
+        # what python-telegram-bot does with markup on every edit
+        'build_and_serialize_us': seconds_per_click(
+            lambda: [build(c).to_json() for c in COUNTS]
+        )
+        * 1e6,
+        'cached_and_serialize_us': seconds_per_click(
+            lambda: [m.to_json() for m in markups]
+        )
+        * 1e6,
+        'build_bytes': allocated_per_click(build),
+        'cached_bytes': allocated_per_click(get_keyboard),
+    }
+    print(json.dumps({name: round(value, 2) for name, value in results.items()}))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+"""
+End-to-end load test of a bot against local mock Bot API server
+
+Starts benchmarks.mock_api server, runs the bot in its own process with
+BOT_API_BASE_URL pointing at the server and simulates users: likebot users
+click reactions on posts, showroombot users ask for files, templatebot
+users chat. Latency is measured from the moment update appears in
+getUpdates feed to the bot call that answers it. Works offline, prints
+one JSON line.
+
+    python -m benchmarks.load likebot --users 2000 --duration 30 --latency 0.05
+    python -m benchmarks.load likebot --workers 4 --flood-rate 0.01
+
+Telegram flood limits are not simulated by the server, bot is started
+with --outbound-rate instead of default 30 requests per second.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import signal
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from benchmarks.handlers import BOT_USER, HOT_POSTS, prefill_votes, update_data
+from benchmarks.mock_api import MockBotAPI, make_app
+
+Key = Tuple[str, str]
+Action = Callable[[int, int], Tuple[Dict[str, Any], Key]]
+
+
+def likebot_action(user_id: int, action_id: int) -> Tuple[Dict[str, Any], Key]:
+    from likebot.config import LIKE_REACTIONS  # pylint: disable=import-outside-toplevel
+
+    post = min(int(random.expovariate(0.1)), HOT_POSTS - 1)
+    update = update_data(
+        action_id,
+        user_id,
+        inline_message_id=f'post-{post}',
+        data=random.choice(list(LIKE_REACTIONS)),
+    )
+    return update, ('answerCallbackQuery', str(action_id))
+
+
+def showroombot_action(user_id: int, action_id: int) -> Tuple[Dict[str, Any], Key]:
+    if random.random() < 0.3:
+        return update_data(action_id, user_id, text='/file'), ('sendMessage', str(user_id))
+    data, method = random.choice(
+        [('upload_png', 'sendPhoto'), ('upload_video', 'sendVideo'), ('upload_audio', 'sendAudio')]
+    )
+    return update_data(action_id, user_id, data=data), (method, str(user_id))
+
+
+def templatebot_action(user_id: int, action_id: int) -> Tuple[Dict[str, Any], Key]:
+    return update_data(action_id, user_id, text=f'hello {action_id}'), ('sendMessage', str(user_id))
+
+
+ACTIONS: Dict[str, Action] = {
+    'likebot': likebot_action,
+    'showroombot': showroombot_action,
+    'templatebot': templatebot_action,
+}
+
+
+class LoadGenerator:
+    """ Simulated users, each waits for the answer before the next action """
+
+    def __init__(self, api: MockBotAPI, action: Action, think_time: float, timeout: float):
+        self.api = api
+        self.action = action
+        self.think_time = think_time
+        self.timeout = timeout
+        self.latencies: List[float] = []
+        self.timeouts = 0
+        self._waiting: Dict[Key, 'asyncio.Future[float]'] = {}
+        self._action_ids = itertools.count(1)
+        api.listeners.append(self._on_call)
+
+    def _on_call(self, method: str, parameters: Dict[str, Any]) -> None:
+        answered = parameters.get('callback_query_id') or parameters.get('chat_id')
+        future = self._waiting.pop((method, str(answered)), None)
+        if future and not future.done():
+            future.set_result(time.perf_counter())
+
+    async def user(self, user_id: int, deadline: float) -> None:
+        loop = asyncio.get_running_loop()
+        await asyncio.sleep(random.uniform(0, self.think_time))
+        while loop.time() < deadline:
+            update, key = self.action(user_id, next(self._action_ids))
+            future: 'asyncio.Future[float]' = loop.create_future()
+            self._waiting[key] = future
+            started = time.perf_counter()
+            self.api.push_update(update)
+            try:
+                self.latencies.append(await asyncio.wait_for(future, self.timeout) - started)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                self._waiting.pop(key, None)
+            await asyncio.sleep(random.expovariate(1 / self.think_time))
+
+
+def latency_summary(latencies: List[float]) -> Dict[str, float]:
+    if len(latencies) < 2:
+        return {}
+    percentiles = statistics.quantiles(latencies, n=100)
+    return {
+        'p50_ms': round(percentiles[49] * 1000, 1),
+        'p95_ms': round(percentiles[94] * 1000, 1),
+        'p99_ms': round(percentiles[98] * 1000, 1),
+        'max_ms': round(max(latencies) * 1000, 1),
+    }
+
+
+async def start_bot(args: argparse.Namespace, directory: str, port: int) -> Any:
+    if args.workers:
+        command = ['-m', 'common.dispatcher', f'{args.bot}.bot', str(args.workers)]
+    else:
+        command = ['-m', f'{args.bot}.bot']
+    env = dict(
+        os.environ,
+        BOT_API_BASE_URL=f'http://127.0.0.1:{port}/bot',
+        BOT_API_BASE_FILE_URL=f'http://127.0.0.1:{port}/file/bot',
+        TELEGRAM_BOT_TOKEN=f'{BOT_USER["id"]}:load',
+        LIKE_DB_FILE_NAME=os.path.join(directory, 'like.db'),
+        FILE_ID_CACHE_FILE_NAME=os.path.join(directory, 'file_id.db'),
+        OUTBOUND_RATE=str(args.outbound_rate),
+        WEBHOOK_URL='',
+    )
+    with open(args.bot_log, 'ab') as log:
+        return await asyncio.create_subprocess_exec(
+            sys.executable, *command, env=env, stdout=log, stderr=log
+        )
+
+
+async def run(args: argparse.Namespace, directory: str) -> Dict[str, Any]:
+    api = MockBotAPI(args.latency, args.error_rate, args.flood_rate)
+    server = make_app(api).listen(args.port, '127.0.0.1')
+    process = await start_bot(args, directory, args.port)
+    try:
+        await asyncio.wait_for(api.polled.wait(), 60)
+        generator = LoadGenerator(api, ACTIONS[args.bot], args.think_time, args.timeout)
+        started = asyncio.get_running_loop().time()
+        await asyncio.gather(
+            *[generator.user(user_id, started + args.duration) for user_id in range(args.users)]
+        )
+        elapsed = asyncio.get_running_loop().time() - started
+    finally:
+        api.stop()
+        if process.returncode is None:
+            process.send_signal(signal.SIGINT)
+            try:
+                await asyncio.wait_for(process.wait(), 30)
+            except asyncio.TimeoutError:
+                process.kill()
+        server.stop()
+    return {
+        'bot': args.bot,
+        'workers': args.workers,
+        'users': args.users,
+        'seconds': round(elapsed, 1),
+        'answered': len(generator.latencies),
+        'answered_per_sec': round(len(generator.latencies) / elapsed, 1),
+        'timeouts': generator.timeouts,
+        'latency': latency_summary(generator.latencies),
+        'api_calls': dict(sorted(api.calls.items())),
+        'injected_errors': dict(api.injected),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('bot', choices=sorted(ACTIONS))
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--duration', type=float, default=20, help='seconds of load')
+    parser.add_argument('--think-time', type=float, default=1, help='mean pause of user')
+    parser.add_argument('--timeout', type=float, default=10, help='answer wait limit')
+    parser.add_argument('--latency', type=float, default=0.02, help='mean API latency')
+    parser.add_argument('--error-rate', type=float, default=0, help='share of BadRequest')
+    parser.add_argument('--flood-rate', type=float, default=0, help='share of RetryAfter')
+    parser.add_argument('--outbound-rate', type=float, default=1000)
+    parser.add_argument('--workers', type=int, default=0, help='run with common.dispatcher')
+    parser.add_argument('--votes', type=int, default=100000, help='votes in likebot database')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--bot-log', default=os.devnull, help='file for output of the bot')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        if args.bot == 'likebot' and args.votes:
+            prefill_votes(os.path.join(directory, 'like.db'), args.votes)
+        print(json.dumps(asyncio.run(run(args, directory))), flush=True)
+
+
+if __name__ == '__main__':
+    main()
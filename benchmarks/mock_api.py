@@ -0,0 +1,187 @@
+"""
+Local stand-in for Telegram Bot API server
+
+Serves getUpdates from an in-memory feed and answers the other methods
+with plausible results after configurable latency. Uploaded files get new
+file_id, sending unknown file_id fails like in Telegram. A share of calls
+can be answered with BadRequest or RetryAfter (429) errors.
+
+Bots are pointed at it with BOT_API_BASE_URL=http://127.0.0.1:<port>/bot,
+see benchmarks/load.py that starts both and drives load.
+"""
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import tornado.web
+
+from benchmarks.handlers import BOT_USER, EXAMPLE
+
+# methods sending a file: name of the parameter with the file
+MEDIA_PARAMETERS = {
+    'sendPhoto': 'photo',
+    'sendVideo': 'video',
+    'sendAudio': 'audio',
+    'sendDocument': 'document',
+    'sendAnimation': 'animation',
+}
+# service methods are never slowed down or failed
+SERVICE_METHODS = {'getMe', 'getUpdates', 'deleteWebhook', 'setWebhook', 'close', 'logOut'}
+
+# sent as is, the other parameters are JSON
+TEXT_PARAMETERS = {'text', 'caption', 'callback_query_id', 'inline_query_id', 'inline_message_id'}
+
+Listener = Callable[[str, Dict[str, Any]], None]
+
+
+class MockBotAPI:
+    """ State of the mock server: update feed, issued file ids and counters """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        flood_rate: float = 0.0,
+        retry_after: int = 1,
+    ) -> None:
+        self.latency = latency
+        self.error_rate = error_rate
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.calls: Counter = Counter()  # type: ignore[type-arg]
+        self.injected: Counter = Counter()  # type: ignore[type-arg]
+        self.listeners: List[Listener] = []
+        self.polled = asyncio.Event()
+        self.stopped = False
+        self._updates: List[Dict[str, Any]] = []
+        self._new_updates = asyncio.Event()
+        self._update_ids = itertools.count(1)
+        self._ids = itertools.count(1)
+        self._file_ids: Set[str] = set()
+
+    def push_update(self, update: Dict[str, Any]) -> int:
+        """ Add update to getUpdates feed, update_id is assigned here """
+        update['update_id'] = next(self._update_ids)
+        self._updates.append(update)
+        self._new_updates.set()
+        return int(update['update_id'])
+
+    def stop(self) -> None:
+        """ Answer pending getUpdates calls, so server can be stopped """
+        self.stopped = True
+        self._new_updates.set()
+
+    async def get_updates(self, parameters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        self.polled.set()
+        offset = int(parameters.get('offset') or 0)
+        # confirmed updates are never sent again
+        self._updates = [update for update in self._updates if update['update_id'] >= offset]
+        if not self._updates and not self.stopped:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(
+                    self._new_updates.wait(), float(parameters.get('timeout') or 0)
+                )
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[: int(parameters.get('limit') or 100)]
+
+    def _injected_error(self) -> Optional[Tuple[int, Dict[str, Any]]]:
+        chance = random.random()
+        if chance < self.flood_rate:
+            self.injected['429'] += 1
+            return 429, {
+                'error_code': 429,
+                'description': f'Too Many Requests: retry after {self.retry_after}',
+                'parameters': {'retry_after': self.retry_after},
+            }
+        if chance < self.flood_rate + self.error_rate:
+            self.injected['400'] += 1
+            return 400, {'error_code': 400, 'description': 'Bad Request: injected error'}
+        return None
+
+    def _message(self, method: str, parameters: Dict[str, Any], files: Set[str]) -> Any:
+        message = {
+            'message_id': next(self._ids),
+            'date': int(time.time()),
+            'chat': {'id': int(parameters.get('chat_id') or 0), 'type': 'private'},
+            'from': BOT_USER,
+            'text': parameters.get('text', ''),
+        }
+        media = MEDIA_PARAMETERS.get(method)
+        if media:
+            file_id = parameters.get(media, '')
+            if files or str(file_id).startswith('attach://'):
+                file_id = f'mock-{next(self._ids)}'
+                self._file_ids.add(file_id)
+            elif file_id not in self._file_ids:
+                return None
+            item = {'file_id': file_id, 'file_unique_id': file_id, 'duration': 1}
+            if media == 'photo':
+                message['photo'] = [dict(photo, **item) for photo in EXAMPLE['message']['photo']]
+            else:
+                message[media] = dict(item, width=320, height=168)
+        return message
+
+    async def call(
+        self, method: str, parameters: Dict[str, Any], files: Set[str]
+    ) -> Tuple[int, Dict[str, Any]]:
+        """ Result of API method as HTTP status and response body """
+        self.calls[method] += 1
+        if method == 'getUpdates':
+            return 200, {'ok': True, 'result': await self.get_updates(parameters)}
+        if method not in SERVICE_METHODS:
+            if self.latency:
+                await asyncio.sleep(random.uniform(0.5, 1.5) * self.latency)
+            error = self._injected_error()
+            if error:
+                return error[0], dict(error[1], ok=False)
+            for listener in self.listeners:
+                listener(method, parameters)
+
+        result: Any = True
+        if method == 'getMe':
+            result = BOT_USER
+        elif method.startswith('send') or (
+            method.startswith('edit') and 'inline_message_id' not in parameters
+        ):
+            result = self._message(method, parameters, files)
+            if result is None:
+                return 400, {
+                    'ok': False,
+                    'error_code': 400,
+                    'description': 'Bad Request: wrong file identifier/HTTP URL specified',
+                }
+        return 200, {'ok': True, 'result': result}
+
+
+class MethodHandler(tornado.web.RequestHandler):
+    def initialize(self, api: MockBotAPI) -> None:  # pylint: disable=arguments-differ
+        self.api = api  # pylint: disable=attribute-defined-outside-init
+
+    async def post(self, _: str, method: str) -> None:
+        parameters = {}
+        for name in self.request.arguments:
+            value = self.get_argument(name)
+            try:
+                parameters[name] = value if name in TEXT_PARAMETERS else json.loads(value)
+            except ValueError:
+                parameters[name] = value
+        status, body = await self.api.call(method, parameters, set(self.request.files))
+        self.set_status(status)
+        self.set_header('Content-Type', 'application/json')
+        self.write(json.dumps(body))
+
+    get = post
+
+
+def make_app(api: MockBotAPI) -> tornado.web.Application:
+    return tornado.web.Application(
+        [(r'/bot([^/]+)/(\w+)', MethodHandler, {'api': api})],
+        # injected errors would flood the access log
+        log_function=lambda handler: None,
+    )
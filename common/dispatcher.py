@@ -0,0 +1,193 @@
+"""
+Run one bot in several processes without races on the same chat or post
+
+Front process receives updates (webhook or long polling, see common.webhook)
+and sends each one to a worker process chosen by stable hash of its key:
+inline message for reactions, chat for messages. Worker hands updates over to
+update processor of the bot, so updates with the same key are handled in
+order and updates with different keys concurrently.
+
+Front does not import the bot module: token and allowed updates come from
+the `config` module of the bot package, databases are created or migrated
+by `migrate()` of its `migrate` module, if there is one, before workers
+start.
+
+    python -m common.dispatcher likebot.bot 4
+"""
+import asyncio
+import importlib
+import importlib.util
+import logging
+import multiprocessing
+import queue as queue_module
+import signal
+import sys
+import zlib
+from multiprocessing.process import BaseProcess
+from multiprocessing.queues import Queue
+from typing import Any, Dict, List, Optional
+
+from telegram import Update
+
+from common.log import setup_logging
+from common.metrics import METRICS_PORT, start_metrics_server
+from common.transport import application_builder
+from common.update_processor import update_key
+from common.webhook import (
+    WEBHOOK_LISTEN,
+    WEBHOOK_PATH,
+    WEBHOOK_PORT,
+    WEBHOOK_URL,
+    secret_token,
+)
+
+logger = logging.getLogger(__name__)
+
+# updates waiting for one worker, front stops reading updates when it is full
+WORKER_QUEUE_SIZE = 1000
+# seconds to finish queued updates on shutdown
+DRAIN_TIMEOUT = 30.0
+# seconds to wait for free place in worker queue before checking the worker
+SEND_TIMEOUT = 1.0
+
+# spawn: worker must not inherit SQLite connections and threads of the front
+context = multiprocessing.get_context('spawn')
+
+
+def _worker_main(
+    module_name: str, queue: 'Queue[Optional[Dict[str, Any]]]', index: int
+) -> None:
+    # front serves METRICS_PORT, workers the next ports
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT + 1 + index)
+    asyncio.run(_work(module_name, queue))
+
+
+async def _work(module_name: str, queue: 'Queue[Optional[Dict[str, Any]]]') -> None:
+    application = importlib.import_module(module_name).build_application()
+    loop = asyncio.get_running_loop()
+    async with application:
+        if application.post_init:
+            await application.post_init(application)
+        processor = application.update_processor
+        while True:
+            data = await loop.run_in_executor(None, queue.get)
+            if data is None:
+                break
+            update = Update.de_json(data, application.bot)
+            # the same way Application hands over updates received from Telegram
+            await processor.process_update(update, application.process_update(update))
+        # e.g. drain_updates: updates taken by processor are handled before shutdown
+        if application.post_stop:
+            await application.post_stop(application)
+    if application.post_shutdown:
+        await application.post_shutdown(application)
+
+
+class Dispatcher:
+    """ Front process: receives updates and keeps worker processes running """
+
+    def __init__(self, module_name: str, workers: int) -> None:
+        if WEBHOOK_URL:
+            secret_token()  # fail before workers are started
+        self.module_name = module_name
+        package = module_name.rsplit('.', 1)[0]
+        self.config = importlib.import_module(f'{package}.config')
+        if importlib.util.find_spec(f'{package}.migrate'):
+            importlib.import_module(f'{package}.migrate').migrate()
+        self.queues: List['Queue[Optional[Dict[str, Any]]]'] = [
+            context.Queue(WORKER_QUEUE_SIZE) for _ in range(workers)
+        ]
+        self.processes: List[BaseProcess] = [self._start(index) for index in range(workers)]
+        self.stopping = asyncio.Event()
+
+    def _start(self, index: int) -> BaseProcess:
+        process = context.Process(
+            target=_worker_main,
+            args=(self.module_name, self.queues[index], index),
+            name=f'{self.module_name}-worker-{index}',
+        )
+        process.start()
+        return process
+
+    def supervise(self) -> None:
+        """ Restart crashed workers, their queued updates are kept """
+        for index, process in enumerate(self.processes):
+            if not process.is_alive():
+                logger.error('%s exited with %s, restarting', process.name, process.exitcode)
+                self.processes[index] = self._start(index)
+
+    async def send(self, update: Update) -> None:
+        index = zlib.crc32(update_key(update).encode()) % len(self.queues)
+        loop = asyncio.get_running_loop()
+        data = update.to_dict()
+        # waits while worker queue is full, dead worker never frees it
+        while True:
+            try:
+                await loop.run_in_executor(
+                    None, self.queues[index].put, data, True, SEND_TIMEOUT
+                )
+                return
+            except queue_module.Full:
+                self.supervise()
+
+    async def serve(self) -> None:
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self.stopping.set)
+
+        start_metrics_server()
+        # bare application without handlers, only its updater is used
+        front = application_builder(self.config.TELEGRAM_BOT_TOKEN).build()
+        update_queue = front.update_queue
+        updater = front.updater
+        assert updater is not None
+        async with updater:
+            if WEBHOOK_URL:
+                await updater.start_webhook(
+                    listen=WEBHOOK_LISTEN,
+                    port=WEBHOOK_PORT,
+                    url_path=WEBHOOK_PATH,
+                    webhook_url=WEBHOOK_URL,
+                    secret_token=secret_token(),
+                    allowed_updates=self.config.ALLOWED_UPDATES,
+                )
+            else:
+                await updater.start_polling(allowed_updates=self.config.ALLOWED_UPDATES)
+            while not self.stopping.is_set():
+                self.supervise()
+                try:
+                    update = await asyncio.wait_for(update_queue.get(), 1.0)
+                except asyncio.TimeoutError:
+                    continue
+                if isinstance(update, Update):
+                    await self.send(update)
+            await updater.stop()
+        # updates received before stop are handled too
+        while not update_queue.empty():
+            update = update_queue.get_nowait()
+            if isinstance(update, Update):
+                await self.send(update)
+        await self.drain()
+
+    async def drain(self) -> None:
+        """ Let workers finish queued updates and exit """
+        loop = asyncio.get_running_loop()
+        for index, queue in enumerate(self.queues):
+            try:
+                await loop.run_in_executor(None, queue.put, None, True, DRAIN_TIMEOUT)
+            except queue_module.Full:
+                # worker is dead or stuck, it is terminated below
+                logger.warning('Queue of %s is full', self.processes[index].name)
+        for process in self.processes:
+            await loop.run_in_executor(None, process.join, DRAIN_TIMEOUT)
+            if process.is_alive():
+                logger.warning('%s did not stop in time, terminating', process.name)
+                process.terminate()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit(__doc__)
+    setup_logging()
+    asyncio.run(Dispatcher(sys.argv[1], int(sys.argv[2])).serve())
@@ -1 +1,2 @@
-from .upload import Resource, ResourceType, upload
+from .broadcast import BroadcastResult, broadcast
+from .upload import Resource, ResourceType, ensure_uploaded, upload
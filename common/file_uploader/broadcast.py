@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import os
+import weakref
+from dataclasses import dataclass
+from typing import IO, AsyncIterator, Iterable, Optional, Set
+
+from telegram import Bot, error
+
+from common.outbound import BROADCAST_PRIORITY, priority_kwargs
+from common.rate_limit import TokenBucket
+
+from .upload import Resource, get_upload_method, upload
+
+logger = logging.getLogger(__name__)
+
+# Telegram allows about 30 messages per second to different chats
+BROADCAST_RATE = 25.0
+
+# broadcasts of bot without PriorityRateLimiter share the limit, by event loop
+_buckets: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, TokenBucket]' = (
+    weakref.WeakKeyDictionary()
+)
+
+
+@dataclass
+class BroadcastResult:
+    chat_id: int
+    ok: bool
+    error: Optional[str] = None
+
+
+def read_progress(progress_file: Optional[str]) -> Set[int]:
+    """ Chats that already got the message in previous run, failed ones are tried again """
+    if not progress_file or not os.path.exists(progress_file):
+        return set()
+    done = set()
+    with open(progress_file) as file:
+        for line in file:
+            chat_id, _, status = line.rstrip('\n').partition('\t')
+            if status == 'ok':
+                done.add(int(chat_id))
+    return done
+
+
+def _shared_bucket(bot: Bot) -> Optional[TokenBucket]:
+    """ Bucket for broadcasts of bot, None if its PriorityRateLimiter paces them """
+    if priority_kwargs(bot, BROADCAST_PRIORITY):
+        return None
+    loop = asyncio.get_running_loop()
+    if loop not in _buckets:
+        _buckets[loop] = TokenBucket(BROADCAST_RATE)
+    return _buckets[loop]
+
+
+async def _send(
+        bot: Bot,
+        bucket: Optional[TokenBucket],
+        chat_id: int,
+        resource: Resource,
+        text: Optional[str],
+        max_retries: int,
+) -> BroadcastResult:
+    upload_method = await get_upload_method(bot, resource)
+    # broadcast gives way to replies when bot has PriorityRateLimiter
+    extra = priority_kwargs(bot, BROADCAST_PRIORITY)
+    for attempt in range(max_retries + 1):
+        if bucket:
+            await bucket.acquire()
+        try:
+            await upload_method(chat_id, resource.file_id, caption=text, **extra)
+            return BroadcastResult(chat_id, True)
+        except error.RetryAfter as e:
+            if bucket is None:
+                # PriorityRateLimiter has retried it already
+                return BroadcastResult(chat_id, False, str(e))
+            # limit is global for the bot, so all senders wait
+            bucket.pause(float(e.retry_after))
+            last_error: Exception = e
+        except error.BadRequest as e:
+            return BroadcastResult(chat_id, False, str(e))
+        except error.NetworkError as e:
+            await asyncio.sleep(2 ** attempt)
+            last_error = e
+        except error.TelegramError as e:
+            # blocked by user, chat was deleted, etc: retry will not help
+            return BroadcastResult(chat_id, False, str(e))
+    return BroadcastResult(chat_id, False, str(last_error))
+
+
+async def _upload_first(
+        bot: Bot,
+        bucket: Optional[TokenBucket],
+        chat_id: int,
+        resource: Resource,
+        text: Optional[str],
+) -> BroadcastResult:
+    if bucket:
+        await bucket.acquire()
+    try:
+        await upload(bot, chat_id, resource, text)
+    except Exception as e:  # pylint: disable=broad-except
+        return BroadcastResult(chat_id, False, str(e))
+    return BroadcastResult(chat_id, True)
+
+
+def _record(progress: Optional[IO[str]], result: BroadcastResult) -> BroadcastResult:
+    if progress:
+        # error text goes to one line after the tab
+        status = 'ok' if result.ok else ' '.join(str(result.error).split())
+        progress.write(f'{result.chat_id}\t{status}\n')
+        progress.flush()
+    return result
+
+
+async def broadcast(
+        bot: Bot,
+        chat_ids: Iterable[int],
+        resource: Resource,
+        text: Optional[str] = None,
+        concurrency: int = 20,
+        max_retries: int = 3,
+        progress_file: Optional[str] = None,
+) -> AsyncIterator[BroadcastResult]:
+    """
+    Send one resource to many chats, yield result for every chat as it is ready
+
+    File is uploaded once, then sent by file_id. Bot with PriorityRateLimiter
+    sends them after replies to users and retries RetryAfter itself. Otherwise
+    all broadcasts of the process share BROADCAST_RATE messages per second,
+    RetryAfter pauses all senders. Each chat gets one message, so per-chat
+    limit is never hit. Results are appended to progress_file,
+    running broadcast with the same file again skips chats that got the message.
+    """
+    done = read_progress(progress_file)
+    bucket = _shared_bucket(bot)
+    pending: Set['asyncio.Task[BroadcastResult]'] = set()
+    progress = open(progress_file, 'a') if progress_file else None
+    try:
+        for chat_id in chat_ids:
+            if chat_id in done:
+                continue
+            done.add(chat_id)
+            if not resource.file_id:
+                # first chat gets the file from disk, the rest by its file_id
+                result = await _upload_first(bot, bucket, chat_id, resource, text)
+                yield _record(progress, result)
+                continue
+            pending.add(
+                asyncio.ensure_future(
+                    _send(bot, bucket, chat_id, resource, text, max_retries)
+                )
+            )
+            if len(pending) < concurrency:
+                continue
+            finished, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in finished:
+                yield _record(progress, task.result())
+        while pending:
+            finished, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in finished:
+                yield _record(progress, task.result())
+    finally:
+        for task in pending:
+            task.cancel()
+        if progress:
+            progress.close()
@@ -0,0 +1,88 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from typing import Dict, Optional, Tuple
+
+from telegram import Bot
+
+FILE_ID_CACHE_FILE_NAME = os.environ.get(
+    'FILE_ID_CACHE_FILE_NAME', 'common/file_uploader/file_id.db'
+)
+
+# content hash of files already read by this process, by (path, mtime, size)
+_hashes: Dict[Tuple[str, int, int], str] = {}
+
+
+def content_hash(path: str) -> str:
+    """ sha256 of file content, file is read in chunks and only once while unchanged """
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    if key not in _hashes:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(2 ** 20), b''):
+                digest.update(chunk)
+        _hashes[key] = digest.hexdigest()
+    return _hashes[key]
+
+
+class FileIdCache:
+    """
+    file_id of uploaded files stored on disk and shared by all processes
+
+    Files are keyed by content hash and resource type, so the same file under
+    different path is uploaded once. file_id is valid only for the bot that
+    uploaded it, so bot id is part of the key too. Methods block on SQLite,
+    async code calls them with asyncio.to_thread.
+    """
+
+    def __init__(self, file_name: str = FILE_ID_CACHE_FILE_NAME) -> None:
+        self.conn = sqlite3.connect(file_name, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS file_id '
+                '(bot_id text, content_hash text, resource_type text, file_id text NOT NULL, '
+                'PRIMARY KEY (bot_id, content_hash, resource_type))'
+            )
+            self.conn.commit()
+
+    @staticmethod
+    def bot_id(bot: Bot) -> str:
+        # bot id is the first part of the token, no need to call getMe
+        return bot.token.split(':', 1)[0]
+
+    def get(self, bot: Bot, content_hash: str, resource_type: str) -> Optional[str]:
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT file_id FROM file_id '
+                'WHERE bot_id=? AND content_hash=? AND resource_type=?',
+                (self.bot_id(bot), content_hash, resource_type),
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, bot: Bot, content_hash: str, resource_type: str, file_id: str) -> None:
+        with self._lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO file_id(bot_id, content_hash, resource_type, file_id) '
+                'VALUES (?, ?, ?, ?)',
+                (self.bot_id(bot), content_hash, resource_type, file_id),
+            )
+            self.conn.commit()
+
+    def delete(
+            self, bot: Bot, content_hash: str, resource_type: str, file_id: Optional[str] = None
+    ) -> None:
+        """ Forget file_id, only the given one if set, not a new one stored meanwhile """
+        with self._lock:
+            self.conn.execute(
+                'DELETE FROM file_id WHERE bot_id=? AND content_hash=? AND resource_type=? '
+                'AND file_id=COALESCE(?, file_id)',
+                (self.bot_id(bot), content_hash, resource_type, file_id),
+            )
+            self.conn.commit()
+
+
+file_id_cache = FileIdCache()
@@ -1,8 +1,18 @@
+import asyncio
+import logging
+import os
+import time
 from dataclasses import dataclass
 from enum import Enum
-from typing import Callable, Optional
+from typing import BinaryIO, Callable, Dict, Optional, Tuple
 
-from telegram import Bot, Message, error
+from telegram import Bot, InputFile, Message, error
+
+from common.metrics import UPLOAD_BYTES, UPLOAD_SECONDS
+
+from .cache import content_hash, file_id_cache
+
+logger = logging.getLogger(__name__)
 
 
 class ResourceType(str, Enum):
@@ -21,6 +31,19 @@ class Resource:
     file_id: Optional[str] = None
 
 
+class StreamingInputFile(InputFile):
+    """
+    InputFile that passes open file to HTTP client instead of reading it
+
+    python-telegram-bot reads whole file into memory, httpx reads file
+    objects in small chunks while sending request.
+    """
+
+    def __init__(self, file: BinaryIO, filename: str) -> None:
+        super().__init__(b'', filename=filename)
+        self.input_file_content = file  # type: ignore[assignment]
+
+
 async def get_upload_method(bot: Bot, resource: Resource) -> Callable:  # type:ignore
     """ Select upload file method depends in file type """
     if resource.resource_type == ResourceType.PICTURE:
@@ -54,31 +77,131 @@ async def _upload_new(
         bot: Bot, chat_id: int, resource: Resource, text: Optional[str] = None
 ) -> None:
     """ Upload file from file system """
-    if resource.path:
-        uploaded_from = open(resource.path, 'rb')
-    else:
+    if not resource.path:
         raise Exception('Broken resources')
     upload_method = await get_upload_method(bot, resource)
-    try:
-        result = await upload_method(chat_id, uploaded_from, caption=text)
-    except error.BadRequest:
-        raise Exception('Not supported media resources')
+    size = os.path.getsize(resource.path)
+    started = time.monotonic()
+    with open(resource.path, 'rb') as uploaded_from:
+        input_file = StreamingInputFile(uploaded_from, os.path.basename(resource.path))
+        try:
+            result = await upload_method(chat_id, input_file, caption=text)
+        except error.BadRequest:
+            raise Exception('Not supported media resources')
+    duration = time.monotonic() - started
+    UPLOAD_BYTES.inc(resource.resource_type.value, amount=size)
+    UPLOAD_SECONDS.observe(duration, resource.resource_type.value)
+    logger.info(
+        'Uploaded %s: %d bytes in %.2f s, %.0f bytes/s',
+        resource.path,
+        size,
+        duration,
+        size / duration if duration else 0,
+    )
+
+    file_id = await extract_resources_id(resource, result)
+    resource.file_id = file_id
+    file_hash = await asyncio.to_thread(content_hash, resource.path)
+    await asyncio.to_thread(file_id_cache.set, bot, file_hash, resource.resource_type, file_id)
+
+
+# uploads in progress, by (bot id, content hash, resource type)
+_uploads: Dict[Tuple[str, str, str], 'asyncio.Future[str]'] = {}
 
-    resource.file_id = extract_resources_id(resource, result)
+
+async def _upload_once(
+        bot: Bot, chat_id: int, resource: Resource, file_hash: str, text: Optional[str]
+) -> bool:
+    """
+    Upload file once for all concurrent requests of it
+
+    Returns True if file was sent by this call. Otherwise it was uploaded by
+    another call, resource.file_id is set and file still has to be sent.
+    """
+    key = (file_id_cache.bot_id(bot), file_hash, resource.resource_type.value)
+    while key in _uploads:
+        in_flight = _uploads[key]
+        try:
+            resource.file_id = await asyncio.shield(in_flight)
+            return False
+        except asyncio.CancelledError:
+            # uploading call was cancelled, not this one: try to upload ourselves
+            if not in_flight.cancelled():
+                raise
+
+    future: 'asyncio.Future[str]' = asyncio.get_running_loop().create_future()
+    _uploads[key] = future
+    try:
+        await _upload_new(bot, chat_id, resource, text)
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # mark as retrieved, nobody could wait for it
+        raise
+    else:
+        future.set_result(resource.file_id or '')
+    finally:
+        del _uploads[key]
+    return True
 
 
 async def upload(
         bot: Bot, chat_id: int, resource: Resource, text: Optional[str] = None
 ) -> Resource:
     """ Upload file to Telegram """
+    file_hash = None
+    if not resource.file_id and resource.path:
+        # file could be uploaded before by another process or bot restart
+        file_hash = await asyncio.to_thread(content_hash, resource.path)
+        cached = await asyncio.to_thread(
+            file_id_cache.get, bot, file_hash, resource.resource_type
+        )
+        # another call could upload the file while cache was read
+        resource.file_id = resource.file_id or cached
+        if not resource.file_id and await _upload_once(
+                bot, chat_id, resource, file_hash, text
+        ):
+            return resource
     if resource.file_id:
         upload_method = await get_upload_method(bot, resource)
         try:
             await upload_method(chat_id, resource.file_id, caption=text)
         except error.BadRequest:
-            raise Exception('Not supported media resources')
+            if not resource.path:
+                raise Exception('Not supported media resources')
+            # file_id is stale or rejected, forget it and upload file again
+            if file_hash is None:
+                file_hash = await asyncio.to_thread(content_hash, resource.path)
+            await asyncio.to_thread(
+                file_id_cache.delete, bot, file_hash, resource.resource_type, resource.file_id
+            )
+            # concurrent call with the same stale file_id could upload the file already
+            resource.file_id = await asyncio.to_thread(
+                file_id_cache.get, bot, file_hash, resource.resource_type
+            )
+            if not resource.file_id and await _upload_once(
+                    bot, chat_id, resource, file_hash, text
+            ):
+                return resource
+            await upload_method(chat_id, resource.file_id, caption=text)
     elif resource.path:
         await _upload_new(bot, chat_id, resource, text)
     else:
         raise Exception('Broken resources')
     return resource
+
+
+async def ensure_uploaded(bot: Bot, chat_id: int, resource: Resource) -> Resource:
+    """ Get file_id of resource, file is sent to chat only if it was never uploaded """
+    if not resource.file_id and resource.path:
+        file_hash = await asyncio.to_thread(content_hash, resource.path)
+        cached = await asyncio.to_thread(
+            file_id_cache.get, bot, file_hash, resource.resource_type
+        )
+        # another call could upload the file while cache was read
+        resource.file_id = resource.file_id or cached
+    if not resource.file_id:
+        await upload(bot, chat_id, resource)
+    return resource
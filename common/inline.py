@@ -0,0 +1,83 @@
+import asyncio
+import hashlib
+import logging
+import os
+from functools import lru_cache
+from typing import Callable, Dict, Sequence, Set
+
+from telegram import InlineQuery, InlineQueryResult, Update, error
+from telegram.ext import CallbackContext
+
+logger = logging.getLogger(__name__)
+
+# how long Telegram may serve the same answer without asking the bot
+INLINE_CACHE_TIME = int(os.environ.get('INLINE_CACHE_TIME', 300))
+# wait this long for the user to stop typing before answering
+INLINE_DEBOUNCE = float(os.environ.get('INLINE_DEBOUNCE', 0.3))
+
+ResultsBuilder = Callable[[str], Sequence[InlineQueryResult]]
+
+
+def result_id(query: str, kind: str = '') -> str:
+    """ Same query gives the same id, so Telegram can cache and dedupe results """
+    return hashlib.sha1(f'{kind}:{query}'.encode()).hexdigest()
+
+
+class InlineAnswerer:
+    """
+    Answer inline queries with cached results, skipping superseded keystrokes
+
+    Every keystroke of inline query is a new update. Only the last query of
+    the user received during `debounce` seconds is answered, results for the
+    same text are built once and kept in LRU cache.
+    """
+
+    def __init__(
+        self,
+        build_results: ResultsBuilder,
+        cache_time: int = INLINE_CACHE_TIME,
+        is_personal: bool = False,
+        debounce: float = INLINE_DEBOUNCE,
+        cache_size: int = 1024,
+    ) -> None:
+        self.build_results = lru_cache(maxsize=cache_size)(build_results)
+        self.cache_time = cache_time
+        self.is_personal = is_personal
+        self.debounce = debounce
+        # the latest not answered query of every user
+        self._pending: Dict[int, InlineQuery] = {}
+        self._tasks: Set['asyncio.Task[None]'] = set()
+
+    async def handle(self, update: Update, _: CallbackContext) -> None:
+        """ InlineQueryHandler callback """
+        query = update.inline_query
+        if not query.query:
+            return
+        if not self.debounce:
+            await self._answer(query)
+            return
+
+        user_id = query.from_user.id
+        waiting = user_id in self._pending
+        self._pending[user_id] = query
+        if not waiting:
+            # answer in background, so debounce does not hold other updates
+            task = asyncio.create_task(self._answer_latest(user_id))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _answer_latest(self, user_id: int) -> None:
+        await asyncio.sleep(self.debounce)
+        await self._answer(self._pending.pop(user_id))
+
+    async def _answer(self, query: InlineQuery) -> None:
+        try:
+            await query.answer(
+                self.build_results(query.query),
+                cache_time=self.cache_time,
+                is_personal=self.is_personal,
+            )
+        except error.TelegramError as e:
+            # e.g. query is too old, user has already typed something else,
+            # or network error: the user types again or the query expires anyway
+            logger.warning('Inline query %s was not answered: %s', query.id, e)
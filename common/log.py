@@ -0,0 +1,152 @@
+"""
+Logging setup shared by all bots
+
+Records are only put into a queue on the thread that logs them, a listener
+thread formats them and writes to stderr, so slow output never blocks the
+event loop. When the queue is full, records are dropped and counted.
+Records of chatty loggers (every HTTP request, every processed update) and
+records logged with `extra=SAMPLED` below WARNING are sampled: only
+LOG_SAMPLE_RATE of them are written, each with `sample_rate` field.
+
+    LOG_LEVEL=INFO LOG_LEVELS=telegram.ext=DEBUG,httpx=WARNING LOG_SAMPLE_RATE=0.01
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Iterable, Optional
+
+from common.metrics import Counter, registry
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+# levels of single loggers, comma separated name=LEVEL pairs
+LOG_LEVELS = os.environ.get('LOG_LEVELS', '')
+# json lines or text for reading in terminal
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', 0.01))
+LOG_SAMPLED_LOGGERS = os.environ.get(
+    'LOG_SAMPLED_LOGGERS', 'httpx,telegram.ext.Application,telegram.ext.ExtBot'
+)
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# log high-volume event only sometimes: logger.info(..., extra=SAMPLED)
+SAMPLED = {'sampled': True}
+
+LOG_DROPPED = registry.register(
+    Counter('log_records_dropped_total', 'Log records dropped on full queue')
+)
+
+# attributes of every LogRecord, the others came from `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """ One JSON object per line with `extra` fields of record """
+
+    def format(self, record: logging.LogRecord) -> str:
+        data: Dict[str, Any] = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'process': record.process,
+        }
+        for name, value in vars(record).items():
+            if name not in _RECORD_ATTRIBUTES:
+                data[name] = value
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data['exc'] = record.exc_text
+        if record.stack_info:
+            data['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """ Pass only `rate` share of records below WARNING from given loggers """
+
+    def __init__(self, rate: float, loggers: Iterable[str]) -> None:
+        super().__init__()
+        self.rate = rate
+        self.prefixes = tuple(loggers)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        if not getattr(record, 'sampled', False) and not self._chatty(record.name):
+            return True
+        record.sample_rate = self.rate
+        return random.random() < self.rate
+
+    def _chatty(self, name: str) -> bool:
+        return any(
+            name == prefix or name.startswith(prefix + '.') for prefix in self.prefixes
+        )
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """ Put records to the queue as they are, listener thread formats them """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # message is built from args in listener thread, records are not
+        # pickled, they stay in this process
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_DROPPED.inc()
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # waits for free place, the queue may be full on exit
+        self.queue.put(self._sentinel)  # type: ignore[attr-defined]
+
+
+_listener: Optional[QueueListener] = None
+
+
+def parse_levels(levels: str) -> Dict[str, str]:
+    """ 'httpx=WARNING,telegram=INFO' -> {'httpx': 'WARNING', 'telegram': 'INFO'} """
+    result = {}
+    for pair in levels.split(','):
+        name, _, level = pair.partition('=')
+        if name.strip() and level.strip():
+            result[name.strip()] = level.strip().upper()
+    return result
+
+
+def setup_logging(level: str = LOG_LEVEL, log_format: str = LOG_FORMAT) -> None:
+    """ Configure root logger once per process, next calls do nothing """
+    global _listener  # pylint: disable=global-statement
+    if _listener is not None:
+        return
+    output = logging.StreamHandler(sys.stderr)
+    if log_format == 'json':
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    records: 'queue.Queue[logging.LogRecord]' = queue.Queue(LOG_QUEUE_SIZE)
+    handler = NonBlockingQueueHandler(records)
+    handler.addFilter(SamplingFilter(LOG_SAMPLE_RATE, LOG_SAMPLED_LOGGERS.split(',')))
+    root = logging.getLogger()
+    for old_handler in root.handlers[:]:
+        root.removeHandler(old_handler)
+    root.addHandler(handler)
+    root.setLevel(level)
+    for name, logger_level in parse_levels(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(logger_level)
+
+    _listener = _Listener(records, output)
+    _listener.start()
+    # write what is left in the queue on exit
+    atexit.register(_listener.stop)
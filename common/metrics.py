@@ -0,0 +1,273 @@
+"""
+In-process metrics of the bots in Prometheus text format
+
+Counters and histograms are updated right on hot paths: handlers, Bot API
+requests, SQLite queries of likebot and file uploads. One observation costs
+a bisect and an uncontended lock, so they are always on. With METRICS_PORT
+set a thread of the bot serves them on http://METRICS_LISTEN:METRICS_PORT/metrics.
+Admins can get short summary in chat, see `stats_text`.
+"""
+import bisect
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+from telegram.ext import Application
+
+METRICS_PORT = int(os.environ.get('METRICS_PORT', 0))
+METRICS_LISTEN = os.environ.get('METRICS_LISTEN', '127.0.0.1')
+
+# seconds, from fast SQLite queries to slow Bot API calls
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+UPLOAD_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+Labels = Tuple[str, ...]
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labels: Labels = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._lock = threading.Lock()
+
+    def label_text(self, values: Labels, extra: str = '') -> str:
+        pairs = [f'{name}="{value}"' for name, value in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.kind}',
+            *self.samples(),
+        ]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labels: Labels = ()) -> None:
+        super().__init__(name, documentation, labels)
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def snapshot(self) -> List[Tuple[Labels, float]]:
+        with self._lock:
+            return sorted(self.values.items())
+
+    def samples(self) -> List[str]:
+        return [
+            f'{self.name}{self.label_text(labels)} {value}' for labels, value in self.snapshot()
+        ]
+
+
+class Gauge(Metric):
+    """ Value read from the bot state when metrics are collected """
+
+    kind = 'gauge'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Labels,
+        collect: Callable[[], Dict[Labels, float]],
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self.collect = collect
+
+    def samples(self) -> List[str]:
+        return [
+            f'{self.name}{self.label_text(labels)} {value}'
+            for labels, value in sorted(self.collect().items())
+        ]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Labels = (),
+        buckets: Tuple[float, ...] = BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self.buckets = buckets
+        # count per bucket (last one is +Inf), then sum and count
+        self.series: Dict[Labels, List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [0.0] * (len(self.buckets) + 3)
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def summary(self) -> Dict[Labels, Tuple[int, float, float]]:
+        """ Count, mean and upper bound of p99 of every series """
+        with self._lock:
+            series = {labels: list(values) for labels, values in self.series.items()}
+        result = {}
+        for labels, values in sorted(series.items()):
+            count = int(values[-1])
+            seen = 0.0
+            p99 = float('inf')
+            for bound, bucket in zip(self.buckets, values):
+                seen += bucket
+                if seen >= count * 0.99:
+                    p99 = bound
+                    break
+            result[labels] = (count, values[-2] / count, p99)
+        return result
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            series = {labels: list(values) for labels, values in self.series.items()}
+        lines = []
+        for labels, values in sorted(series.items()):
+            cumulative = 0.0
+            for bound, bucket in zip(self.buckets + (float('inf'),), values):
+                cumulative += bucket
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{bound}"'
+                lines.append(f'{self.name}_bucket{self.label_text(labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{self.label_text(labels)} {values[-2]}')
+            lines.append(f'{self.name}_count{self.label_text(labels)} {values[-1]}')
+        return lines
+
+
+M = TypeVar('M', bound=Metric)
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: M) -> M:
+        """ Add metric, metric with the same name is replaced """
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines += metric.render()
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+HANDLER_SECONDS = registry.register(
+    Histogram('bot_handler_seconds', 'Time spent in update handler', ('handler',))
+)
+API_SECONDS = registry.register(
+    Histogram('bot_api_request_seconds', 'Bot API request time', ('method',))
+)
+API_ERRORS = registry.register(
+    Counter('bot_api_errors_total', 'Failed Bot API requests', ('method', 'error'))
+)
+DB_SECONDS = registry.register(
+    Histogram('likebot_db_seconds', 'Time of LikeDatabase operation', ('operation',))
+)
+UPLOAD_BYTES = registry.register(
+    Counter('upload_bytes_total', 'Bytes of files uploaded to Telegram', ('resource_type',))
+)
+UPLOAD_SECONDS = registry.register(
+    Histogram('upload_seconds', 'File upload time', ('resource_type',), UPLOAD_BUCKETS)
+)
+
+
+def _timed(name: str, callback: Callable[..., Any]) -> Callable[..., Any]:
+    @functools.wraps(callback)
+    async def timed_callback(update: object, context: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            return await callback(update, context)
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - started, name)
+
+    return timed_callback
+
+
+def instrument_handlers(application: Application) -> None:
+    """ Record time of every handler added to application so far """
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            name = getattr(handler.callback, '__qualname__', type(handler.callback).__name__)
+            handler.callback = _timed(name, handler.callback)
+
+
+def stats_text() -> str:
+    """ Short summary of metrics for admin """
+    lines = []
+    for title, histogram in (
+        ('Handlers', HANDLER_SECONDS),
+        ('Bot API', API_SECONDS),
+        ('Database', DB_SECONDS),
+    ):
+        summary = histogram.summary()
+        if not summary:
+            continue
+        lines.append(f'{title}:')
+        for labels, (count, mean, p99) in summary.items():
+            lines.append(
+                f'  {labels[0]}: {count}, avg {mean * 1000:.1f} ms, p99 < {p99 * 1000:g} ms'
+            )
+    errors = API_ERRORS.snapshot()
+    if errors:
+        lines.append('Bot API errors:')
+        lines += [f'  {method} {error}: {count:g}' for (method, error), count in errors]
+    return '\n'.join(lines) or 'No data yet'
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+
+def start_metrics_server(
+    port: int = METRICS_PORT, listen: str = METRICS_LISTEN
+) -> Optional[ThreadingHTTPServer]:
+    """ Serve /metrics from a daemon thread, nothing is started without port """
+    if not port:
+        return None
+    server = ThreadingHTTPServer((listen, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    return server
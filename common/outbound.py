@@ -0,0 +1,214 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import weakref
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Tuple, Union
+
+from telegram import Bot
+from telegram.error import RetryAfter, TelegramError
+from telegram.ext import BaseRateLimiter, ExtBot
+
+from common.metrics import Counter, Gauge, Labels, registry
+from common.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# lower value is sent first
+ANSWER_PRIORITY = 0
+EDIT_PRIORITY = 1
+SEND_PRIORITY = 2
+BROADCAST_PRIORITY = 3
+
+# Telegram limits: about 30 messages per second overall, 1 per second
+# to the same private chat and 20 per minute to the same group
+OUTBOUND_RATE = float(os.environ.get('OUTBOUND_RATE', 30))
+PRIVATE_CHAT_INTERVAL = float(os.environ.get('PRIVATE_CHAT_INTERVAL', 1))
+GROUP_CHAT_INTERVAL = float(os.environ.get('GROUP_CHAT_INTERVAL', 3))
+
+OUTBOUND_RETRIES = registry.register(
+    Counter('bot_outbound_retries_total', 'Requests retried after RetryAfter', ('method',))
+)
+
+Waiter = Tuple[int, int, Optional[str], 'asyncio.Future[None]']
+JSONResult = Union[bool, Dict[str, Any], List[Dict[str, Any]]]
+
+# limiters of all bots of the process, for the queue depth gauge
+_limiters: 'weakref.WeakSet[PriorityRateLimiter]' = weakref.WeakSet()
+
+
+def _queue_depth() -> Dict[Labels, float]:
+    depth: Dict[Labels, float] = {}
+    for limiter in list(_limiters):
+        for priority, count in limiter.queue_depth().items():
+            depth[(str(priority),)] = depth.get((str(priority),), 0) + count
+    return depth
+
+
+registry.register(
+    Gauge(
+        'bot_outbound_queue_depth',
+        'Requests waiting for their turn to be sent',
+        ('priority',),
+        _queue_depth,
+    )
+)
+
+
+def endpoint_priority(endpoint: str) -> int:
+    if endpoint.startswith('answer'):
+        # callback and inline answers: user is looking at spinner right now
+        return ANSWER_PRIORITY
+    if endpoint.startswith('edit'):
+        return EDIT_PRIORITY
+    return SEND_PRIORITY
+
+
+def priority_kwargs(bot: Bot, priority: int) -> Dict[str, Any]:
+    """ Extra arguments of bot method to send request with given priority """
+    if isinstance(bot, ExtBot) and bot.rate_limiter is not None:
+        return {'rate_limit_args': {'priority': priority}}
+    # plain Bot does not accept rate_limit_args
+    return {}
+
+
+class PriorityRateLimiter(BaseRateLimiter[Dict[str, Any]]):
+    """
+    Single outbound queue for all Bot API requests of the application
+
+    Requests wait in priority queue: answers before edits, edits before
+    messages, messages before broadcasts (`rate_limit_args={'priority': 3}`).
+    The next request is let out when overall rate allows it and its chat was
+    not written to recently. RetryAfter pauses whole queue and request is
+    retried up to max_retries times.
+    """
+
+    def __init__(
+        self,
+        rate: float = OUTBOUND_RATE,
+        private_chat_interval: float = PRIVATE_CHAT_INTERVAL,
+        group_chat_interval: float = GROUP_CHAT_INTERVAL,
+        max_retries: int = 3,
+    ) -> None:
+        self.private_chat_interval = private_chat_interval
+        self.group_chat_interval = group_chat_interval
+        self.max_retries = max_retries
+        self._bucket = TokenBucket(rate)
+        self._queue: List[Waiter] = []
+        self._order = itertools.count()
+        # time when chat may get the next message
+        self._chat_ready: Dict[str, float] = {}
+        self._wakeup = asyncio.Event()
+        self._pump: Optional['asyncio.Task[None]'] = None
+        self._closed = False
+        _limiters.add(self)
+
+    async def initialize(self) -> None:
+        # bot is initialized by both Application and Updater
+        if self._pump is None:
+            self._closed = False
+            self._pump = asyncio.create_task(self._run())
+
+    async def shutdown(self) -> None:
+        """ Stop sending, requests still waiting in the queue fail """
+        self._closed = True
+        if self._pump:
+            self._pump.cancel()
+            await asyncio.gather(self._pump, return_exceptions=True)
+            self._pump = None
+        while self._queue:
+            future = heapq.heappop(self._queue)[3]
+            if not future.done():
+                future.set_exception(TelegramError('Outbound queue is shut down'))
+
+    def queue_depth(self) -> Dict[int, int]:
+        """ Number of waiting requests by priority """
+        depth: Dict[int, int] = {}
+        for priority, _, _, _ in self._queue:
+            depth[priority] = depth.get(priority, 0) + 1
+        return depth
+
+    def _chat_interval(self, chat: str) -> float:
+        if chat.startswith(('-', '@')):
+            return self.group_chat_interval
+        return self.private_chat_interval
+
+    def _pop_ready(self, now: float) -> Tuple[Optional[Waiter], Optional[float]]:
+        """ Highest priority request whose chat can be written to, or when it is possible """
+        skipped: List[Waiter] = []
+        ready: Optional[Waiter] = None
+        while self._queue:
+            waiter = heapq.heappop(self._queue)
+            if waiter[3].done():
+                continue  # caller was cancelled
+            chat = waiter[2]
+            if chat is None or self._chat_ready.get(chat, 0) <= now:
+                ready = waiter
+                break
+            skipped.append(waiter)
+        for waiter in skipped:
+            heapq.heappush(self._queue, waiter)
+        if ready or not skipped:
+            return ready, None
+        return None, min(self._chat_ready[str(waiter[2])] for waiter in skipped) - now
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            waiter, delay = self._pop_ready(loop.time())
+            if waiter is not None and not self._bucket.try_acquire():
+                # higher priority request could come while waiting for rate
+                heapq.heappush(self._queue, waiter)
+                waiter, delay = None, self._bucket.wait_time()
+            if waiter is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            chat = waiter[2]
+            if chat is not None:
+                self._chat_ready[chat] = loop.time() + self._chat_interval(chat)
+                if len(self._chat_ready) > 10000:
+                    self._forget_chats(loop.time())
+            waiter[3].set_result(None)
+
+    def _forget_chats(self, now: float) -> None:
+        for chat, ready in list(self._chat_ready.items()):
+            if ready <= now:
+                del self._chat_ready[chat]
+
+    async def _wait_turn(self, priority: int, chat: Optional[str]) -> None:
+        if self._closed:
+            raise TelegramError('Outbound queue is shut down')
+        future: 'asyncio.Future[None]' = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._order), chat, future))
+        self._wakeup.set()
+        await future
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, JSONResult]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[Dict[str, Any]],
+    ) -> JSONResult:
+        priority = (rate_limit_args or {}).get('priority', endpoint_priority(endpoint))
+        chat_id = data.get('chat_id')
+        # answers are not messages in chat, only overall rate applies to them
+        chat = str(chat_id) if chat_id is not None and priority != ANSWER_PRIORITY else None
+        for attempt in range(self.max_retries + 1):
+            await self._wait_turn(priority, chat)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                OUTBOUND_RETRIES.inc(endpoint)
+                logger.warning('%s hit flood limit, retry in %s s', endpoint, e.retry_after)
+                self._bucket.pause(float(e.retry_after))
+        raise RuntimeError('unreachable')
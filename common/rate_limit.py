@@ -0,0 +1,46 @@
+import asyncio
+from typing import Optional
+
+
+class TokenBucket:
+    """ Allow `rate` operations per second on average with bursts up to `capacity` """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self._updated: Optional[float] = None
+        # waiters get tokens in order of arrival
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        if self._updated is not None:
+            self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            self._refill(loop.time())
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill(loop.time())
+            self.tokens -= 1
+
+    def pause(self, seconds: float) -> None:
+        """ Take away tokens for `seconds`, e.g. after Telegram answered with RetryAfter """
+        self._refill(asyncio.get_running_loop().time())
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+    def try_acquire(self) -> bool:
+        """ Take a token if one is available right now, without waiting """
+        self._refill(asyncio.get_running_loop().time())
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def wait_time(self) -> float:
+        """ Seconds until the next token is available """
+        self._refill(asyncio.get_running_loop().time())
+        return max(0.0, (1 - self.tokens) / self.rate)
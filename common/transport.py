@@ -0,0 +1,246 @@
+"""
+HTTP transport shared by all bots
+
+Requests to Bot API go through three separate connection pools, so long
+polling, tiny calls like answerCallbackQuery and media uploads never wait
+for each other:
+
+    updates - getUpdates only, one long request at a time
+    api     - every request without attached files
+    media   - multipart uploads and file downloads
+
+Sizes, timeouts and keep-alive of every pool are set from environment.
+HTTP/2 (TRANSPORT_HTTP_VERSION=2) needs `python-telegram-bot[http2]`.
+"""
+import asyncio
+import os
+import time
+import weakref
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+from telegram.error import TimedOut
+from telegram.ext import Application, ApplicationBuilder
+from telegram.request import BaseRequest, HTTPXRequest, RequestData
+
+from common.metrics import API_ERRORS, API_SECONDS, Gauge, Labels, registry
+
+# local Bot API server or mock server can be used instead of Telegram
+BOT_API_BASE_URL = os.environ.get('BOT_API_BASE_URL', 'https://api.telegram.org/bot')
+BOT_API_BASE_FILE_URL = os.environ.get(
+    'BOT_API_BASE_FILE_URL', 'https://api.telegram.org/file/bot'
+)
+TRANSPORT_HTTP_VERSION = os.environ.get('TRANSPORT_HTTP_VERSION', '1.1')
+# idle connections are kept open for reuse this number of seconds
+TRANSPORT_KEEPALIVE = float(os.environ.get('TRANSPORT_KEEPALIVE', 30))
+TRANSPORT_API_POOL_SIZE = int(os.environ.get('TRANSPORT_API_POOL_SIZE', 32))
+TRANSPORT_MEDIA_POOL_SIZE = int(os.environ.get('TRANSPORT_MEDIA_POOL_SIZE', 4))
+TRANSPORT_API_TIMEOUT = float(os.environ.get('TRANSPORT_API_TIMEOUT', 5))
+TRANSPORT_MEDIA_TIMEOUT = float(os.environ.get('TRANSPORT_MEDIA_TIMEOUT', 60))
+# getUpdates waits for updates up to `timeout` of run_polling on top of it
+TRANSPORT_UPDATES_TIMEOUT = float(os.environ.get('TRANSPORT_UPDATES_TIMEOUT', 10))
+# how long request may wait for free connection before TimedOut
+TRANSPORT_POOL_TIMEOUT = float(os.environ.get('TRANSPORT_POOL_TIMEOUT', 5))
+
+
+@dataclass
+class PoolStats:
+    """ How long requests waited for free connection in pool """
+    size: int
+    requests: int = 0
+    waited: int = 0
+    wait_seconds: float = 0.0
+    max_wait: float = 0.0
+    in_use: int = 0
+
+    def record(self, wait: float) -> None:
+        self.requests += 1
+        if wait > 0.001:
+            self.waited += 1
+            self.wait_seconds += wait
+            self.max_wait = max(self.max_wait, wait)
+
+
+# pools of all applications of the process, for pool gauges
+_pools: 'weakref.WeakSet[PoolRequest]' = weakref.WeakSet()
+
+
+class PoolRequest(HTTPXRequest):
+    """
+    HTTPXRequest with keep-alive setting and measured waiting for connection
+
+    Requests take a slot before going to httpx, so waiting for connection
+    happens here, where it is timed, and never inside httpx pool.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        size: int,
+        timeout: float,
+        keepalive: float = TRANSPORT_KEEPALIVE,
+        pool_timeout: float = TRANSPORT_POOL_TIMEOUT,
+        http_version: str = TRANSPORT_HTTP_VERSION,
+    ) -> None:
+        # used by _build_client, which is called from parent __init__
+        self.keepalive = keepalive
+        super().__init__(
+            connection_pool_size=size,
+            read_timeout=timeout,
+            write_timeout=timeout,
+            connect_timeout=min(timeout, TRANSPORT_API_TIMEOUT),
+            pool_timeout=pool_timeout,
+            http_version=http_version,  # type: ignore[arg-type]
+            media_write_timeout=timeout,
+        )
+        self.name = name
+        self.pool_timeout = pool_timeout
+        self.stats = PoolStats(size)
+        self._slots = asyncio.Semaphore(size)
+        _pools.add(self)
+
+    def _build_client(self) -> httpx.AsyncClient:
+        limits = self._client_kwargs['limits']
+        assert isinstance(limits, httpx.Limits)
+        size = limits.max_connections
+        self._client_kwargs['limits'] = httpx.Limits(
+            max_connections=size,
+            max_keepalive_connections=size,
+            keepalive_expiry=self.keepalive,
+        )
+        return super()._build_client()
+
+    def use_transport(self, transport: httpx.AsyncBaseTransport) -> None:
+        """ Send requests through given httpx transport, e.g. fake one in benchmarks """
+        self._client_kwargs['transport'] = transport  # type: ignore[assignment]
+        self._client = self._build_client()
+
+    async def do_request(  # type: ignore[override]
+        self,
+        url: str,
+        method: str,
+        request_data: Optional[RequestData] = None,
+        **timeouts: Optional[float],
+    ) -> Tuple[int, bytes]:
+        if self._slots.locked():
+            started = time.monotonic()
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.pool_timeout)
+            except asyncio.TimeoutError as e:
+                raise TimedOut(f'All connections of {self.name} pool are occupied') from e
+            self.stats.record(time.monotonic() - started)
+        else:
+            # free slot is taken without switching to other tasks
+            await self._slots.acquire()
+            self.stats.record(0.0)
+        self.stats.in_use += 1
+        try:
+            return await super().do_request(url, method, request_data, **timeouts)
+        finally:
+            self.stats.in_use -= 1
+            self._slots.release()
+
+
+def _pool_totals(value: Callable[[PoolStats], float]) -> Callable[[], Dict[Labels, float]]:
+    def collect() -> Dict[Labels, float]:
+        totals: Dict[Labels, float] = {}
+        for pool in list(_pools):
+            totals[(pool.name,)] = totals.get((pool.name,), 0) + value(pool.stats)
+        return totals
+
+    return collect
+
+
+registry.register(
+    Gauge(
+        'bot_pool_wait_seconds',
+        'Total time requests waited for free connection',
+        ('pool',),
+        _pool_totals(lambda stats: stats.wait_seconds),
+    )
+)
+registry.register(
+    Gauge(
+        'bot_pool_in_use',
+        'Connections busy with requests',
+        ('pool',),
+        _pool_totals(lambda stats: stats.in_use),
+    )
+)
+
+
+class RoutingRequest(BaseRequest):
+    """ Send uploads and downloads through media pool and other calls through api pool """
+
+    def __init__(self, api: PoolRequest, media: PoolRequest) -> None:
+        self.api = api
+        self.media = media
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return self.api.read_timeout
+
+    async def initialize(self) -> None:
+        await self.api.initialize()
+        await self.media.initialize()
+
+    async def shutdown(self) -> None:
+        await self.api.shutdown()
+        await self.media.shutdown()
+
+    async def do_request(  # type: ignore[override]
+        self,
+        url: str,
+        method: str,
+        request_data: Optional[RequestData] = None,
+        **timeouts: Optional[float],
+    ) -> Tuple[int, bytes]:
+        if url.startswith(BOT_API_BASE_FILE_URL):
+            pool, api_method = self.media, 'download'
+        else:
+            pool = self.media if request_data and request_data.multipart_data else self.api
+            api_method = url.rsplit('/', 1)[-1]
+        started = time.perf_counter()
+        try:
+            status, payload = await pool.do_request(url, method, request_data, **timeouts)
+        except Exception as e:
+            API_ERRORS.inc(api_method, type(e).__name__)
+            raise
+        finally:
+            API_SECONDS.observe(time.perf_counter() - started, api_method)
+        if status >= 400:
+            API_ERRORS.inc(api_method, str(status))
+        return status, payload
+
+
+def application_builder(token: str) -> ApplicationBuilder:
+    """ Application builder with bot token and transport configured from environment """
+    request = RoutingRequest(
+        api=PoolRequest('api', TRANSPORT_API_POOL_SIZE, TRANSPORT_API_TIMEOUT),
+        media=PoolRequest('media', TRANSPORT_MEDIA_POOL_SIZE, TRANSPORT_MEDIA_TIMEOUT),
+    )
+    get_updates_request = PoolRequest('updates', 1, TRANSPORT_UPDATES_TIMEOUT)
+    return (
+        Application.builder()
+        .token(token)
+        .base_url(BOT_API_BASE_URL)
+        .base_file_url(BOT_API_BASE_FILE_URL)
+        .request(request)
+        .get_updates_request(get_updates_request)
+    )
+
+
+def application_pools(application: Application) -> List[PoolRequest]:
+    """ Every connection pool of application built by application_builder """
+    # pylint: disable=protected-access
+    get_updates_request, request = application.bot._request
+    requests = [get_updates_request]
+    if isinstance(request, RoutingRequest):
+        requests += [request.api, request.media]
+    return [pool for pool in requests if isinstance(pool, PoolRequest)]
+
+
+def pool_stats(application: Application) -> Dict[str, PoolStats]:
+    """ Stats of every connection pool of application built by application_builder """
+    return {pool.name: pool.stats for pool in application_pools(application)}
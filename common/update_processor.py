@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict
+
+from telegram import Update
+from telegram.ext import Application, BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+# updates handled at the same time by one Application
+UPDATE_CONCURRENCY = int(os.environ.get('UPDATE_CONCURRENCY', 64))
+# updates of one chat waiting for their turn, receiving stops when it is full
+UPDATE_QUEUE_SIZE = int(os.environ.get('UPDATE_QUEUE_SIZE', 100))
+# seconds to finish queued updates on stop, the rest are cancelled
+UPDATE_DRAIN_TIMEOUT = float(os.environ.get('UPDATE_DRAIN_TIMEOUT', 10))
+
+
+def update_key(update: Update) -> str:
+    """ Updates with the same key must be handled in order """
+    if update.callback_query and update.callback_query.inline_message_id:
+        return update.callback_query.inline_message_id
+    if update.effective_chat:
+        return str(update.effective_chat.id)
+    if update.effective_user:
+        return str(update.effective_user.id)
+    return str(update.update_id)
+
+
+class KeyedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Handle updates of different chats concurrently and of the same chat in order
+
+    Every key (chat or inline message) has a bounded queue and one task
+    that handles its updates one by one. Application hands updates over one
+    by one too, so when a queue is full it waits and stops taking new updates.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = UPDATE_CONCURRENCY,
+        queue_size: int = UPDATE_QUEUE_SIZE,
+        key: Callable[[Update], str] = update_key,
+    ) -> None:
+        # Application awaits processor only while update is put into queue,
+        # handlers are limited by own semaphore
+        super().__init__(max_concurrent_updates=1)
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.key = key
+        self._limit = asyncio.BoundedSemaphore(concurrency)
+        self._queues: Dict[str, 'asyncio.Queue[Awaitable[Any]]'] = {}
+        self._tasks: Dict[str, 'asyncio.Task[None]'] = {}
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        if isinstance(update, Update):
+            key = self.key(update)
+        else:
+            key = f'{type(update).__name__}:{id(update)}'
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = asyncio.Queue(self.queue_size)
+            self._tasks[key] = asyncio.create_task(self._handle(key, queue))
+        await queue.put(coroutine)
+
+    async def _handle(self, key: str, queue: 'asyncio.Queue[Awaitable[Any]]') -> None:
+        """ Handle updates of one key until its queue is empty """
+        try:
+            while not queue.empty():
+                coroutine = queue.get_nowait()
+                async with self._limit:
+                    try:
+                        await coroutine
+                    except Exception:  # pylint: disable=broad-except
+                        logger.exception('Update of %s was not processed', key)
+        finally:
+            del self._queues[key]
+            del self._tasks[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def drain(self, timeout: float = UPDATE_DRAIN_TIMEOUT) -> None:
+        """ Wait for updates that are already taken, cancel what is left after timeout """
+        tasks = list(self._tasks.values())
+        if not tasks:
+            return
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        if not pending:
+            return
+        logger.warning('Updates of %s keys were not handled in %s s', len(pending), timeout)
+        for queue in self._queues.values():
+            while not queue.empty():
+                coroutine = queue.get_nowait()
+                if asyncio.iscoroutine(coroutine):
+                    coroutine.close()
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    async def shutdown(self) -> None:
+        # queues are drained in post_stop, while bot can still send requests
+        await self.drain()
+
+
+async def drain_updates(application: Application) -> None:
+    """ post_stop callback: handle queued updates before bot is shut down """
+    processor = application.update_processor
+    if isinstance(processor, KeyedUpdateProcessor):
+        await processor.drain()
@@ -0,0 +1,81 @@
+"""
+Start bot with webhook when WEBHOOK_URL is set, otherwise with long polling
+
+Webhook server listens on WEBHOOK_LISTEN:WEBHOOK_PORT behind load balancer
+and rejects requests without WEBHOOK_SECRET_TOKEN header, webhook is not
+started without the token. Recorded update can
+be sent to the local server to test it:
+
+    python -m common.webhook json/photo_upload_example.json
+"""
+import os
+import sys
+import urllib.request
+from typing import List
+from urllib.parse import urlparse
+
+from telegram.ext import Application
+
+from common.metrics import start_metrics_server
+
+# public url Telegram sends updates to, e.g. https://example.com/likebot
+WEBHOOK_URL = os.environ.get('WEBHOOK_URL', '')
+WEBHOOK_LISTEN = os.environ.get('WEBHOOK_LISTEN', '127.0.0.1')
+WEBHOOK_PORT = int(os.environ.get('WEBHOOK_PORT', 8443))
+WEBHOOK_SECRET_TOKEN = os.environ.get('WEBHOOK_SECRET_TOKEN')
+# load balancer may forward requests to the same path as public url has
+WEBHOOK_PATH = os.environ.get('WEBHOOK_PATH', urlparse(WEBHOOK_URL).path.strip('/'))
+
+
+def secret_token() -> str:
+    """ WEBHOOK_SECRET_TOKEN, without it anyone could send forged updates to the bot """
+    if not WEBHOOK_SECRET_TOKEN:
+        raise RuntimeError('WEBHOOK_SECRET_TOKEN must be set to run with WEBHOOK_URL')
+    return WEBHOOK_SECRET_TOKEN
+
+
+def run(application: Application, allowed_updates: List[str]) -> None:
+    """
+    Run the bot until the user presses Ctrl-C
+
+    `allowed_updates` are update types handled by the bot, Telegram does
+    not send the others, see ALLOWED_UPDATES in config of every bot.
+    """
+    start_metrics_server()
+    if not WEBHOOK_URL:
+        application.run_polling(allowed_updates=allowed_updates)
+        return
+
+    token = secret_token()
+    application.run_webhook(
+        listen=WEBHOOK_LISTEN,
+        port=WEBHOOK_PORT,
+        url_path=WEBHOOK_PATH,
+        webhook_url=WEBHOOK_URL,
+        secret_token=token,
+        allowed_updates=allowed_updates,
+    )
+
+
+def post_update(file_name: str) -> int:
+    """ Send update from json file to local webhook server, returns HTTP status """
+    with open(file_name, 'rb') as file:
+        body = file.read()
+    request = urllib.request.Request(
+        f'http://{WEBHOOK_LISTEN}:{WEBHOOK_PORT}/{WEBHOOK_PATH}',
+        data=body,
+        headers={
+            'Content-Type': 'application/json',
+            'X-Telegram-Bot-Api-Secret-Token': WEBHOOK_SECRET_TOKEN or '',
+        },
+    )
+    with urllib.request.urlopen(request) as response:
+        status: int = response.status
+    return status
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        sys.exit(__doc__)
+    for update_file in sys.argv[1:]:
+        print(update_file, post_update(update_file))
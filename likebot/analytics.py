@@ -0,0 +1,153 @@
+"""
+Export, daily rollups and archival of likebot votes
+
+Every vote keeps time of its last change and triggers keep `vote_daily`
+rollup: net change of every counter of every post per UTC day. Archival
+deletes votes of posts without votes during the last N days, counters of
+these posts stay in `vote_count` and are not changed by new clicks anymore.
+Works on every shard of LIKE_DB_SHARDS, reads and archival do not block the
+bot, archival with --vacuum does: run it with the bot stopped.
+
+    python -m likebot.analytics export --format csv > votes.csv
+    python -m likebot.analytics top --days 7
+    python -m likebot.analytics daily --days 30
+    python -m likebot.analytics archive --days 180
+"""
+import argparse
+import csv
+import heapq
+import io
+import json
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
+
+from likebot import maintenance
+from likebot.config import LIKE_DB_SHARDS
+from likebot.database import LikeDatabase
+from likebot.sharding import open_shards
+
+DAY = 86400
+EXPORT_FIELDS = ('message', 'user', 'reaction', 'voted_at')
+
+
+def export_votes(
+    databases: Iterable[LikeDatabase], export_format: str = 'ndjson'
+) -> Iterator[str]:
+    """ Lines of export file, votes are streamed from database cursor one by one """
+    if export_format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_FIELDS)
+        for database in databases:
+            for row in maintenance.iter_votes(database):
+                writer.writerow(row)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        # header only, when there are no votes
+        if buffer.tell():
+            yield buffer.getvalue()
+        return
+    for database in databases:
+        for row in maintenance.iter_votes(database):
+            yield json.dumps(dict(zip(EXPORT_FIELDS, row)), ensure_ascii=False) + '\n'
+
+
+def _since_day(days: int) -> int:
+    """ First day of window of `days` days ending today """
+    return int(time.time()) // DAY - days + 1
+
+
+def top_posts(
+    databases: Iterable[LikeDatabase], days: int, limit: int = 10
+) -> List[Tuple[str, int]]:
+    """ Posts with the most new reactions during the last `days` days """
+    top: List[Tuple[str, int]] = []
+    for database in databases:
+        conn = database.connect_reader()
+        try:
+            rows = conn.execute(
+                'SELECT message.inline_message_id, SUM(vote_daily.count) AS total '
+                'FROM vote_daily JOIN message ON message.id = vote_daily.message_id '
+                'WHERE vote_daily.day >= ? GROUP BY vote_daily.message_id '
+                'ORDER BY total DESC LIMIT ?',
+                (_since_day(days), limit),
+            ).fetchall()
+        finally:
+            conn.close()
+        top = heapq.nlargest(limit, top + rows, key=lambda row: row[1])
+    return top
+
+
+def daily_totals(databases: Iterable[LikeDatabase], days: int) -> Dict[str, Dict[str, int]]:
+    """ Net change of every reaction per day, days are ISO dates """
+    totals: Dict[str, Dict[str, int]] = defaultdict(dict)
+    for database in databases:
+        conn = database.connect_reader()
+        try:
+            rows = conn.execute(
+                'SELECT vote_daily.day, reaction.name, SUM(vote_daily.count) FROM vote_daily '
+                'JOIN reaction ON reaction.id = vote_daily.reaction_id '
+                'WHERE vote_daily.day >= ? GROUP BY vote_daily.day, vote_daily.reaction_id',
+                (_since_day(days),),
+            ).fetchall()
+        finally:
+            conn.close()
+        for day, reaction, count in rows:
+            date = datetime.fromtimestamp(day * DAY, timezone.utc).date().isoformat()
+            totals[date][reaction] = totals[date].get(reaction, 0) + count
+    return dict(sorted(totals.items()))
+
+
+def archive(
+    database: LikeDatabase, days: int, batch_size: int = 1000, vacuum: bool = False
+) -> int:
+    """
+    Freeze counters of posts without votes during the last `days` days
+
+    VACUUM rewrites the whole file and locks it while it runs, stop the bot
+    before archiving with vacuum. Returns number of archived posts.
+    """
+    archived = maintenance.archive_inactive(database, int(time.time()) - days * DAY, batch_size)
+    if archived and vacuum:
+        maintenance.vacuum(database)
+    return archived
+
+
+def main(argv: Sequence[str]) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n', maxsplit=1)[0])
+    parser.add_argument('command', choices=['export', 'top', 'daily', 'archive'])
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--format', choices=['ndjson', 'csv'], default='ndjson')
+    parser.add_argument('--limit', type=int, default=10, help='posts shown by top')
+    parser.add_argument(
+        '--vacuum', action='store_true', help='shrink files after archive, bot must be stopped'
+    )
+    args = parser.parse_args(argv)
+
+    databases = open_shards(LIKE_DB_SHARDS)
+    try:
+        if args.command == 'export':
+            sys.stdout.writelines(export_votes(databases, args.format))
+        elif args.command == 'top':
+            for message_id, total in top_posts(databases, args.days, args.limit):
+                print(f'{total}\t{message_id}')
+        elif args.command == 'daily':
+            for date, counts in daily_totals(databases, args.days).items():
+                print(date, json.dumps(counts, ensure_ascii=False))
+        else:
+            archived = sum(
+                archive(database, args.days, vacuum=args.vacuum)
+                for database in databases
+            )
+            print(f'Archived {archived} posts without votes for {args.days} days')
+    finally:
+        for database in databases:
+            database.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,112 @@
+import asyncio
+import functools
+import sqlite3
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from likebot.config import (
+    LIKE_DB_BATCH_INTERVAL,
+    LIKE_DB_BATCH_SIZE,
+    LIKE_DB_READERS,
+    LIKE_DB_SHARDS,
+)
+from likebot.database import LikeDatabase, fetch_counts
+from likebot.sharding import AsyncShardedLikeDatabase, open_shards
+
+
+class AsyncLikeDatabase:
+    """
+    Async facade for LikeDatabase
+
+    All writes go to one dedicated writer thread that owns the main connection,
+    reads go to a small pool of threads with own read-only connections. SQLite
+    calls and commits never run on the event loop thread.
+    """
+
+    def __init__(self, database: LikeDatabase, readers: int = 2) -> None:
+        self.database = database
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='like-db-writer')
+        self._readers: Optional[ThreadPoolExecutor] = None
+        self._local = threading.local()
+        self._reader_connections: List[sqlite3.Connection] = []
+        # in write-behind mode votes are visible only to the writer connection
+        # until commit, so readers would return stale counters
+        if readers > 0 and database.batch_size == 1:
+            self._readers = ThreadPoolExecutor(
+                max_workers=readers,
+                thread_name_prefix='like-db-reader',
+                initializer=self._open_reader,
+            )
+
+    def _open_reader(self) -> None:
+        self._local.conn = self.database.connect_reader()
+        self._reader_connections.append(self._local.conn)
+
+    def _read_counts(self, message_id: str) -> Dict[str, int]:
+        return fetch_counts(self._local.conn, message_id)
+
+    async def _run(self, executor: Executor, func: Callable[..., Any], *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(func, *args))
+
+    async def add_reaction(self, message_id: str, user_id: int, reaction: str) -> bool:
+        changed: bool = await self._run(
+            self._writer, self.database.add_reaction, message_id, user_id, reaction
+        )
+        return changed
+
+    async def check_exists(self, message_id: str, user_id: int) -> bool:
+        result: bool = await self._run(
+            self._writer, self.database.check_exists, message_id, user_id
+        )
+        return result
+
+    async def get_counts(self, message_id: str) -> Dict[str, int]:
+        counts: Dict[str, int]
+        # old votes of post are moved on the first use, reader connections cannot do it
+        if self._readers is None or self.database.migrating:
+            counts = await self._run(self._writer, self.database.get_counts, message_id)
+        else:
+            counts = await self._run(self._readers, self._read_counts, message_id)
+        return counts
+
+    async def load_message(self, message_id: str) -> Tuple[Dict[int, str], Dict[str, int]]:
+        # goes through writer, so it sees every vote submitted before it
+        result: Tuple[Dict[int, str], Dict[str, int]] = await self._run(
+            self._writer, self.database.load_message, message_id
+        )
+        return result
+
+    async def get_count(self, message_id: str, reaction: str) -> Union[str, int]:
+        count = (await self.get_counts(message_id)).get(reaction)
+        if not count:
+            return ''
+        return count
+
+    async def close(self) -> None:
+        """ Flush pending votes and stop worker threads """
+        await self._run(self._writer, self.database.close)
+        self._writer.shutdown()
+        if self._readers is not None:
+            self._readers.shutdown()
+            for conn in self._reader_connections:
+                conn.close()
+
+
+Storage = Union[AsyncLikeDatabase, AsyncShardedLikeDatabase]
+
+
+def open_storage() -> Storage:
+    shards = [
+        AsyncLikeDatabase(database, LIKE_DB_READERS)
+        for database in open_shards(
+            LIKE_DB_SHARDS, LIKE_DB_BATCH_SIZE, LIKE_DB_BATCH_INTERVAL
+        )
+    ]
+    if len(shards) == 1:
+        return shards[0]
+    return AsyncShardedLikeDatabase(shards)
+
+
+like_storage = open_storage()
@@ -1,10 +1,7 @@
 import logging
-from typing import List
-from uuid import uuid4
+from typing import List, Tuple
 
 from telegram import (
-    InlineKeyboardButton,
-    InlineKeyboardMarkup,
     InlineQueryResultArticle,
     InputTextMessageContent,
     Update,
@@ -18,26 +15,48 @@ from telegram.ext import (
     Application,
 )
 
-from likebot.config import TELEGRAM_BOT_TOKEN
-from likebot.database import like_db
-
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.DEBUG
+from common.inline import InlineAnswerer, result_id
+from common.log import SAMPLED, setup_logging
+from common.metrics import Counter, instrument_handlers, registry
+from common.outbound import PriorityRateLimiter
+from common.transport import application_builder
+from common.update_processor import KeyedUpdateProcessor, drain_updates
+from common.webhook import run
+from likebot.async_database import like_storage
+from likebot.cache import like_cache
+from likebot.config import (
+    ALLOWED_UPDATES,
+    LIKE_FLOOD_BURST,
+    LIKE_FLOOD_MAX_KEYS,
+    LIKE_FLOOD_RATE,
+    LIKE_KEYBOARD_EDIT_INTERVAL,
+    LIKE_REACTIONS,
+    TELEGRAM_BOT_TOKEN,
 )
+from likebot.debounce import KeyboardDebouncer
+from likebot.flood import ClickLimiter
+from likebot.keyboards import get_keyboard
+from templatebot.utils import stats_command_handler
+
+setup_logging()
 
 logger = logging.getLogger(__name__)
 
 
-def get_keyboard(like: str = '👍', dislike: str = '👎') -> InlineKeyboardMarkup:
-    """ Create InlineKeyboardMarkup for adding as reaction to post  """
-    return InlineKeyboardMarkup(
-        [
-            [
-                InlineKeyboardButton(like, callback_data='like'),
-                InlineKeyboardButton(dislike, callback_data='dislike'),
-            ],
-        ]
-    )
+async def get_counts(message_id: str) -> Tuple[int, ...]:
+    """ Read current reaction counters of message """
+    counts = await like_cache.get_counts(message_id)
+    return tuple(counts.get(reaction, 0) for reaction in LIKE_REACTIONS)
+
+
+keyboard_debouncer = KeyboardDebouncer(
+    get_counts, get_keyboard, min_interval=LIKE_KEYBOARD_EDIT_INTERVAL
+)
+click_limiter = ClickLimiter(LIKE_FLOOD_RATE, LIKE_FLOOD_BURST, LIKE_FLOOD_MAX_KEYS)
+
+CLICKS = registry.register(
+    Counter('likebot_clicks_total', 'Reaction clicks by outcome', ('outcome',))
+)
 
 
 async def start_command_handler(update: Update, _: CallbackContext) -> None:
@@ -52,51 +71,87 @@ async def button_handler(update: Update, _: CallbackContext) -> None:
     """ Handle all query when user press buttons that created by this bot """
     query = update.callback_query
 
+    # flood of clicks is answered without touching database and keyboard
+    if not click_limiter.allow((query.from_user.id, query.inline_message_id)):
+        CLICKS.inc('limited')
+        await query.answer('Too many clicks, try again later')
+        return
+
     # CallbackQueries need to be answered, even if no notification to the user is needed
     # Some clients may have trouble otherwise. See https://core.telegram.org/bots/api#callbackquery
     await query.answer()
 
-    # add user reaction to database
-    like_db.add_reaction(query.inline_message_id, query.from_user.id, query.data)
-
-    # get data for reply keyboard from db
-    like = f"👍 {like_db.get_count(query.inline_message_id, 'like')}"
-    dislike = f"👎 {like_db.get_count(query.inline_message_id, 'dislike')}"
+    if query.data not in LIKE_REACTIONS:
+        return
+    logger.info(
+        'Reaction %s of %s on %s',
+        query.data,
+        query.from_user.id,
+        query.inline_message_id,
+        extra=SAMPLED,
+    )
 
-    # edit only keyboard that attached to message
-    await query.edit_message_reply_markup(reply_markup=get_keyboard(like, dislike))
+    # add user reaction to database, the same reaction again changes nothing
+    changed = await like_cache.add_reaction(
+        query.inline_message_id, query.from_user.id, query.data
+    )
+    if not changed:
+        CLICKS.inc('unchanged')
+        return
+    CLICKS.inc('changed')
 
+    # edit only keyboard that attached to message, bursts of clicks on
+    # the same message are collapsed into one edit with the latest counters
+    keyboard_debouncer.schedule(query.get_bot(), query.inline_message_id)
 
-async def inline_query_handler(update: Update, _: CallbackContext) -> None:
-    """ Handle the inline query. """
-    if not update.inline_query.query:
-        return
 
-    results: List[InlineQueryResultArticle] = [
+def build_inline_results(text: str) -> List[InlineQueryResultArticle]:
+    """ Post with reaction keyboard, query text is the Markdown text of the post """
+    return [
         InlineQueryResultArticle(
-            id=str(uuid4()),
+            id=result_id(text),
             title='Add reactions to post',
             reply_markup=get_keyboard(),  # add default keyboard with reation
             input_message_content=InputTextMessageContent(
-                update.inline_query.query, parse_mode=ParseMode.MARKDOWN
+                text, parse_mode=ParseMode.MARKDOWN
             ),
         ),
     ]  # struct for show bot menu in telegram
 
-    await update.inline_query.answer(results)  # type: ignore
 
+inline_answerer = InlineAnswerer(build_inline_results)
 
-def main() -> None:
-    """Start the bot."""
+
+async def close_database(_: Application) -> None:
+    """ Commit votes left in write-behind batch before exit """
+    await like_storage.close()
+
+
+def build_application() -> Application:
+    """ Create the Application with all handlers of the bot """
     # Create the Application and pass it your bot's token.
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    application = (
+        application_builder(TELEGRAM_BOT_TOKEN)
+        .concurrent_updates(KeyedUpdateProcessor())
+        .rate_limiter(PriorityRateLimiter())
+        .post_stop(drain_updates)
+        .post_shutdown(close_database)
+        .build()
+    )
 
     application.add_handler(CommandHandler('start', start_command_handler))
-    application.add_handler(InlineQueryHandler(inline_query_handler))
+    application.add_handler(CommandHandler('stats', stats_command_handler))
+    application.add_handler(InlineQueryHandler(inline_answerer.handle))
     application.add_handler(CallbackQueryHandler(button_handler))
 
+    instrument_handlers(application)
+    return application
+
+
+def main() -> None:
+    """Start the bot."""
     # Run the bot until the user presses Ctrl-C
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    run(build_application(), allowed_updates=ALLOWED_UPDATES)
 
 
 if __name__ == '__main__':
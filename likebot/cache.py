@@ -0,0 +1,155 @@
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict
+
+from common.metrics import Gauge, registry
+from likebot.async_database import Storage, like_storage
+from likebot.config import LIKE_CACHE_MEMORY_MB, LIKE_CACHE_TTL
+
+# rough memory cost of one cached vote (dict slot, user id) and of one post,
+# used to turn memory budget into number of cached votes
+VOTE_SIZE = 100
+MESSAGE_SIZE = 1000
+
+
+@dataclass
+class CachedMessage:
+    """ Votes of every user and counters of one post """
+
+    votes: Dict[int, str]
+    counts: Dict[str, int]
+    last_access: float
+
+    @property
+    def size(self) -> int:
+        return MESSAGE_SIZE + VOTE_SIZE * len(self.votes)
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+
+class ReactionCache:
+    """
+    LRU cache of recently clicked posts in front of the vote storage
+
+    Posts are loaded on first click and then served from memory, votes are
+    written through to the storage. Posts are evicted when memory budget is
+    exceeded or when they were not clicked for ttl seconds.
+    """
+
+    def __init__(self, storage: Storage, memory_budget: int, ttl: float) -> None:
+        self.storage = storage
+        self.memory_budget = memory_budget
+        self.ttl = ttl
+        self.size = 0
+        self.stats = CacheStats()
+        self._messages: 'OrderedDict[str, CachedMessage]' = OrderedDict()
+        self._loading: Dict[str, 'asyncio.Future[CachedMessage]'] = {}
+
+    async def _get(self, message_id: str) -> CachedMessage:
+        now = time.monotonic()
+        entry = self._messages.get(message_id)
+        if entry is not None and now - entry.last_access < self.ttl:
+            self.stats.hits += 1
+            entry.last_access = now
+            self._messages.move_to_end(message_id)
+            return entry
+
+        self.stats.misses += 1
+        if entry is not None:
+            self._drop(message_id)
+        # concurrent clicks on a post that is not cached wait for one load
+        loading = self._loading.get(message_id)
+        if loading is None:
+            loading = asyncio.ensure_future(self._load(message_id))
+            self._loading[message_id] = loading
+        return await asyncio.shield(loading)
+
+    async def _load(self, message_id: str) -> CachedMessage:
+        try:
+            votes, counts = await self.storage.load_message(message_id)
+        finally:
+            del self._loading[message_id]
+        entry = CachedMessage(votes, counts, time.monotonic())
+        self._messages[message_id] = entry
+        self.size += entry.size
+        self._evict()
+        return entry
+
+    def _drop(self, message_id: str) -> None:
+        entry = self._messages.pop(message_id, None)
+        if entry is not None:
+            self.size -= entry.size
+
+    def _evict(self) -> None:
+        """ Drop least recently clicked posts while over budget or expired """
+        now = time.monotonic()
+        while self._messages:
+            message_id, entry = next(iter(self._messages.items()))
+            if self.size <= self.memory_budget and now - entry.last_access < self.ttl:
+                return
+            self._drop(message_id)
+            self.stats.evictions += 1
+
+    async def add_reaction(self, message_id: str, user_id: int, reaction: str) -> bool:
+        """ Store user vote, False if user already had this reaction """
+        if self.memory_budget <= 0:
+            return await self.storage.add_reaction(message_id, user_id, reaction)
+
+        entry = await self._get(message_id)
+        previous = entry.votes.get(user_id)
+        if previous == reaction:
+            return False
+        entry.votes[user_id] = reaction
+        if previous is None:
+            self.size += VOTE_SIZE
+        else:
+            entry.counts[previous] -= 1
+        entry.counts[reaction] = entry.counts.get(reaction, 0) + 1
+        try:
+            changed = await self.storage.add_reaction(message_id, user_id, reaction)
+        except Exception:
+            # memory is ahead of the storage now, next click reloads the post
+            self._drop(message_id)
+            raise
+        if not changed:
+            # post was archived after it was loaded, counters are frozen
+            self._drop(message_id)
+            return False
+        self._evict()
+        return True
+
+    async def get_counts(self, message_id: str) -> Dict[str, int]:
+        if self.memory_budget <= 0:
+            return await self.storage.get_counts(message_id)
+        entry = await self._get(message_id)
+        return {reaction: count for reaction, count in entry.counts.items() if count}
+
+    def get_stats(self) -> Dict[str, float]:
+        """ Numbers to size the cache: hit rate close to 1 means budget is enough """
+        requests = self.stats.hits + self.stats.misses
+        return {
+            'hits': self.stats.hits,
+            'misses': self.stats.misses,
+            'evictions': self.stats.evictions,
+            'hit_rate': self.stats.hits / requests if requests else 0.0,
+            'messages': len(self._messages),
+            'size_bytes': self.size,
+        }
+
+
+like_cache = ReactionCache(like_storage, int(LIKE_CACHE_MEMORY_MB * 2 ** 20), LIKE_CACHE_TTL)
+registry.register(
+    Gauge(
+        'likebot_cache',
+        'State of reaction cache, see ReactionCache.get_stats',
+        ('stat',),
+        lambda: {(name,): value for name, value in like_cache.get_stats().items()},
+    )
+)
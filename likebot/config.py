@@ -1,5 +1,54 @@
 import base64
+import os
+from typing import Dict
+
+from telegram import Update
 
 bot_secret = ''
 
-TELEGRAM_BOT_TOKEN = base64.b64decode(bot_secret).decode()
+TELEGRAM_BOT_TOKEN = (
+    os.environ.get('TELEGRAM_BOT_TOKEN') or base64.b64decode(bot_secret).decode()
+)
+ALLOWED_UPDATES = [Update.MESSAGE, Update.INLINE_QUERY, Update.CALLBACK_QUERY]
+
+LIKE_DB_FILE_NAME = os.environ.get('LIKE_DB_FILE_NAME', 'likebot/like.db')
+
+# write-behind: commit votes once per batch instead of once per click
+# (1 means commit every vote right away)
+LIKE_DB_BATCH_SIZE = int(os.environ.get('LIKE_DB_BATCH_SIZE', 1))
+# max seconds a vote may stay uncommitted in write-behind mode
+LIKE_DB_BATCH_INTERVAL = float(os.environ.get('LIKE_DB_BATCH_INTERVAL', 0.05))
+# number of SQLite files votes are spread over, see likebot/sharding.py
+LIKE_DB_SHARDS = int(os.environ.get('LIKE_DB_SHARDS', 1))
+# threads with own read-only connection used by the async storage layer
+LIKE_DB_READERS = int(os.environ.get('LIKE_DB_READERS', 2))
+# memory for in-process cache of recently clicked posts, 0 disables it
+LIKE_CACHE_MEMORY_MB = float(os.environ.get('LIKE_CACHE_MEMORY_MB', 64))
+# post not clicked for this many seconds is reloaded from database
+LIKE_CACHE_TTL = float(os.environ.get('LIKE_CACHE_TTL', 3600))
+# min seconds between two keyboard edits of the same message
+LIKE_KEYBOARD_EDIT_INTERVAL = float(os.environ.get('LIKE_KEYBOARD_EDIT_INTERVAL', 1.0))
+# clicks of one user on one post: burst at once, then rate per second
+# (0 burst disables the limit)
+LIKE_FLOOD_RATE = float(os.environ.get('LIKE_FLOOD_RATE', 1.0))
+LIKE_FLOOD_BURST = float(os.environ.get('LIKE_FLOOD_BURST', 5))
+# users and posts tracked by the limit, about 100 bytes each
+LIKE_FLOOD_MAX_KEYS = int(os.environ.get('LIKE_FLOOD_MAX_KEYS', 100000))
+
+
+def parse_reactions(value: str) -> Dict[str, str]:
+    """ 'like=👍,dislike=👎' -> {'like': '👍', 'dislike': '👎'} """
+    reactions: Dict[str, str] = {}
+    for item in value.split(','):
+        name, _, button = (part.strip() for part in item.partition('='))
+        if not name or not button:
+            raise ValueError(f'LIKE_REACTIONS item {item!r} is not `name=button`')
+        # name is callback data of the button
+        if name in reactions or len(name.encode()) > 64:
+            raise ValueError(f'LIKE_REACTIONS name {name!r} is repeated or too long')
+        reactions[name] = button
+    return reactions
+
+
+# reactions under each post, `name=button` pairs in display order
+LIKE_REACTIONS = parse_reactions(os.environ.get('LIKE_REACTIONS', 'like=👍,dislike=👎'))
@@ -1,68 +1,237 @@
 import sqlite3
-from typing import Union
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+from common.metrics import DB_SECONDS
+from likebot import text_keys
+from likebot.config import LIKE_DB_FILE_NAME, LIKE_REACTIONS
+from likebot.schema import ROLLUP_SCHEMA, SCHEMA
+
+
+def fetch_counts(conn: sqlite3.Connection, message_id: str) -> Dict[str, int]:
+    """ Read all non zero counters of message with one query """
+    with DB_SECONDS.time('fetch_counts'):
+        c = conn.cursor()
+        c.execute(
+            'SELECT reaction.name, vote_count.count FROM message '
+            'JOIN vote_count ON vote_count.message_id = message.id '
+            'JOIN reaction ON reaction.id = vote_count.reaction_id '
+            'WHERE message.inline_message_id=? AND vote_count.count > 0',
+            (message_id,),
+        )
+        return dict(c.fetchall())
 
 
 class LikeDatabase:
     """ Encapsulate working with database """
 
-    DATABASE_FILE_NAME = 'likebot/like.db'
+    DATABASE_FILE_NAME = LIKE_DB_FILE_NAME
+    # bump together with new steps in `migrate`
+    SCHEMA_VERSION = 3
+    # old votes moved by background thread per transaction, and pause between them
+    MIGRATION_BATCH_SIZE = 1000
+    MIGRATION_PAUSE = 0.01
+
+    def __init__(
+        self,
+        file_name: str = DATABASE_FILE_NAME,
+        batch_size: int = 1,
+        batch_interval: float = 0.0,
+        reactions: Iterable[str] = tuple(LIKE_REACTIONS),
+    ) -> None:
+        """
+        Init db and create connection to local sqlite database
 
-    def __init__(self) -> None:
-        """ Init db and create connection to local sqlite database """
-        self.conn = sqlite3.connect(self.DATABASE_FILE_NAME, check_same_thread=False)
-        self.create_db()
+        With batch_size > 1 votes are committed in write-behind mode: up to
+        batch_size votes, or all votes written during batch_interval seconds,
+        share one transaction. They are visible to this connection right away,
+        so counters returned by get_count are never stale.
+        """
+        self.file_name = file_name
+        self.conn = sqlite3.connect(file_name, check_same_thread=False)
+        self.batch_size = max(batch_size, 1)
+        self.batch_interval = batch_interval
+        # connection is shared with the timer thread that commits batches
+        # and with likebot.maintenance, hold the lock while using it
+        self.lock = threading.RLock()
+        self._pending = 0
+        self._flush_timer: Optional[threading.Timer] = None
+        self.reactions: Dict[str, int] = {}
+        # votes of the first bot version are still being moved
+        self.migrating = False
+        self._migration: Optional[threading.Thread] = None
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.create_db(reactions)
+        if self.migrating:
+            self._migration = threading.Thread(
+                target=self._move_text_keys, name='like-db-migration', daemon=True
+            )
+            self._migration.start()
 
-    def create_db(self) -> None:
+    def create_db(self, reactions: Iterable[str]) -> None:
         c = self.conn.cursor()
-        c.execute(
-            'CREATE TABLE IF NOT EXISTS like '
-            '(message_id text, user_id integer, reaction text, PRIMARY KEY (message_id, user_id))'
+        for statement in SCHEMA:
+            c.execute(statement)
+        # reactions are stored as small integer codes, new names get the next code
+        c.executemany(
+            'INSERT OR IGNORE INTO reaction(name) VALUES (?)',
+            [(name,) for name in reactions],
         )
         self.conn.commit()
+        self.reactions = dict(c.execute('SELECT name, id FROM reaction').fetchall())
+        self.migrate()
+        for statement in ROLLUP_SCHEMA:
+            c.execute(statement)
+        self.conn.commit()
 
-    def check_exists(self, message_id: str, user_id: int) -> bool:
+    def migrate(self) -> None:
+        """ Bring database created by older version of the bot to current schema """
         c = self.conn.cursor()
-        c.execute(
-            'SELECT * FROM like WHERE message_id=? AND user_id=?', (message_id, user_id)
+        version = c.execute('PRAGMA user_version').fetchone()[0]
+        if text_keys.prepare(self.conn):
+            # old votes are moved while the bot runs, see _move_text_keys
+            self.reactions = dict(c.execute('SELECT name, id FROM reaction').fetchall())
+            self.migrating = True
+        if version < 3:
+            self._add_timestamps()
+        c.execute(f'PRAGMA user_version = {self.SCHEMA_VERSION}')
+        self.conn.commit()
+
+    def _add_timestamps(self) -> None:
+        """ Add time columns, age of existing posts is counted from upgrade """
+        c = self.conn.cursor()
+        if 'voted_at' not in {row[1] for row in c.execute('PRAGMA table_info(vote)')}:
+            c.execute('ALTER TABLE vote ADD COLUMN voted_at integer')
+            c.execute('ALTER TABLE message ADD COLUMN created integer')
+            c.execute('ALTER TABLE message ADD COLUMN archived_at integer')
+        c.execute('UPDATE message SET created = ? WHERE created IS NULL', (int(time.time()),))
+        self.conn.commit()
+
+    def _move_text_keys(self) -> None:
+        """ Move old votes in small transactions, the bot takes the lock in between """
+        while self.migrating:
+            time.sleep(self.MIGRATION_PAUSE)
+            with self.lock:
+                if not self.migrating:
+                    return  # closed
+                moved = text_keys.move_batch(self.conn, self.reactions, self.MIGRATION_BATCH_SIZE)
+                self._pending += 1
+                self.flush()
+                if not moved:
+                    self.migrating = False
+
+    def _move_message(self, message_id: str) -> None:
+        """ Old votes of post are moved before the post is used, call under the lock """
+        if self.migrating and text_keys.move_message(self.conn, self.reactions, message_id):
+            self._written()
+
+    def connect_reader(self) -> sqlite3.Connection:
+        """ Open extra read-only connection, WAL lets it work next to the writer """
+        return sqlite3.connect(
+            f'file:{self.file_name}?mode=ro', uri=True, check_same_thread=False
         )
 
-        result = c.fetchone()
+    def check_exists(self, message_id: str, user_id: int) -> bool:
+        with self.lock, DB_SECONDS.time('check_exists'):
+            self._move_message(message_id)
+            c = self.conn.cursor()
+            c.execute(
+                'SELECT 1 FROM message JOIN vote ON vote.message_id = message.id '
+                'WHERE message.inline_message_id=? AND vote.user_id=?',
+                (message_id, user_id),
+            )
+            result = c.fetchone()
         if result:
             return True
         return False
 
-    def add(self, message_id: str, user_id: int, reaction: str) -> None:
-        c = self.conn.cursor()
-        c.execute(
-            'INSERT INTO like(message_id, user_id, reaction) values (?, ?, ?)',
-            (message_id, user_id, reaction),
-        )
-        self.conn.commit()
+    def get_counts(self, message_id: str) -> Dict[str, int]:
+        with self.lock:
+            self._move_message(message_id)
+            return fetch_counts(self.conn, message_id)
 
-    def update(self, message_id: str, user_id: int, reaction: str) -> None:
-        c = self.conn.cursor()
-        c.execute(
-            'UPDATE like SET reaction=? WHERE message_id=? AND user_id=?',
-            (reaction, message_id, user_id),
-        )
-        self.conn.commit()
+    def load_message(self, message_id: str) -> Tuple[Dict[int, str], Dict[str, int]]:
+        """ Read votes of every user and counters of message """
+        with self.lock, DB_SECONDS.time('load_message'):
+            self._move_message(message_id)
+            votes = self.conn.execute(
+                'SELECT vote.user_id, reaction.name FROM message '
+                'JOIN vote ON vote.message_id = message.id '
+                'JOIN reaction ON reaction.id = vote.reaction_id '
+                'WHERE message.inline_message_id=?',
+                (message_id,),
+            ).fetchall()
+            return dict(votes), fetch_counts(self.conn, message_id)
 
     def get_count(self, message_id: str, reaction: str) -> Union[str, int]:
-        c = self.conn.cursor()
-        c.execute(
-            'SELECT COUNT(*) FROM like WHERE message_id=? AND reaction=?',
-            (message_id, reaction),
-        )
-        count = c.fetchone()[0]
+        count = self.get_counts(message_id).get(reaction)
         if not count:
             return ''
         return count
 
-    def add_reaction(self, message_id: str, user_id: int, reaction: str) -> None:
-        if self.check_exists(message_id, user_id):
-            self.update(message_id, user_id, reaction)
-        else:
-            self.add(message_id, user_id, reaction)
+    def add_reaction(
+        self, message_id: str, user_id: int, reaction: str, voted_at: Optional[int] = None
+    ) -> bool:
+        """
+        Store user vote, replacing the previous one
+
+        False if user already had this reaction or post is archived,
+        counters of archived posts do not change anymore.
+        """
+        if reaction not in self.reactions:
+            raise ValueError(f'Unknown reaction {reaction}')
+        if voted_at is None:
+            voted_at = int(time.time())
+        with self.lock, DB_SECONDS.time('add_reaction'):
+            self._move_message(message_id)
+            self.conn.execute(
+                'INSERT OR IGNORE INTO message(inline_message_id, created) VALUES (?, ?)',
+                (message_id, voted_at),
+            )
+            cursor = self.conn.execute(
+                'INSERT INTO vote(message_id, user_id, reaction_id, voted_at) '
+                'SELECT id, ?, ?, ? FROM message '
+                'WHERE inline_message_id=? AND archived_at IS NULL '
+                'ON CONFLICT(message_id, user_id) DO UPDATE '
+                'SET reaction_id=excluded.reaction_id, voted_at=excluded.voted_at '
+                'WHERE reaction_id IS NOT excluded.reaction_id',
+                (user_id, self.reactions[reaction], voted_at, message_id),
+            )
+            if not cursor.rowcount:
+                # nothing was written, do not keep empty transaction open
+                if not self._pending:
+                    self.conn.rollback()
+                return False
+            self._written()
+        return True
+
+    def _written(self) -> None:
+        """ Commit now or later, depending on write-behind batch """
+        self._pending += 1
+        if self._pending >= self.batch_size:
+            self.flush()
+        elif self._flush_timer is None:
+            self._flush_timer = threading.Timer(self.batch_interval, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
 
+    def flush(self) -> None:
+        """ Commit votes waiting in write-behind batch """
+        with self.lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if self._pending:
+                with DB_SECONDS.time('commit'):
+                    self.conn.commit()
+                self._pending = 0
 
-like_db = LikeDatabase()
+    def close(self) -> None:
+        with self.lock:
+            # stops moving of old votes, the next run continues it
+            self.migrating = False
+        if self._migration is not None:
+            self._migration.join()
+        self.flush()
+        self.conn.close()
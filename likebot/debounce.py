@@ -0,0 +1,128 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional, Tuple
+
+from telegram import Bot, InlineKeyboardMarkup, error
+
+logger = logging.getLogger(__name__)
+
+Counts = Tuple[int, ...]
+
+
+@dataclass
+class MessageState:
+    """ What was last sent to the message and whether it needs a new edit """
+
+    last_counts: Optional[Counts] = None
+    last_edit: float = 0.0
+    dirty: bool = False
+    task: Optional['asyncio.Task[None]'] = None
+    # edits failed in a row, next attempt waits longer
+    failures: int = 0
+
+
+class KeyboardDebouncer:
+    """
+    Collapse bursts of reactions on one inline message into a single edit
+
+    Every reaction only marks message as dirty. One task per message waits
+    until min_interval has passed since previous edit, reads the latest counts
+    and edits keyboard if they differ from the ones already shown.
+    """
+
+    def __init__(
+        self,
+        get_counts: Callable[[str], Awaitable[Counts]],
+        render: Callable[[Counts], InlineKeyboardMarkup],
+        min_interval: float = 1.0,
+        max_messages: int = 10000,
+        max_retries: int = 5,
+    ) -> None:
+        self.get_counts = get_counts
+        self.render = render
+        self.min_interval = min_interval
+        self.max_messages = max_messages
+        self.max_retries = max_retries
+        self._states: 'OrderedDict[str, MessageState]' = OrderedDict()
+
+    def schedule(self, bot: Bot, inline_message_id: str) -> None:
+        """ Request keyboard refresh, edit is sent later by background task """
+        state = self._states.get(inline_message_id)
+        if state is None:
+            state = self._states[inline_message_id] = MessageState()
+            self._evict()
+        self._states.move_to_end(inline_message_id)
+        state.dirty = True
+        if state.task is None:
+            state.task = asyncio.create_task(self._refresh(bot, inline_message_id, state))
+
+    def _evict(self) -> None:
+        """ Forget the least recently clicked messages that have no edit in flight """
+        for message_id in list(self._states):
+            if len(self._states) <= self.max_messages:
+                return
+            if self._states[message_id].task is None:
+                del self._states[message_id]
+
+    async def _refresh(self, bot: Bot, inline_message_id: str, state: MessageState) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while state.dirty:
+                delay = state.last_edit + self.min_interval - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                # clicks that come during the edit will trigger one more round
+                state.dirty = False
+                try:
+                    counts = await self.get_counts(inline_message_id)
+                except Exception:  # pylint: disable=broad-except
+                    # e.g. database error, the next click schedules a new refresh
+                    logger.exception('Cannot read counters of %s', inline_message_id)
+                    return
+                if counts != state.last_counts:
+                    await self._edit(bot, inline_message_id, state, counts)
+        finally:
+            state.task = None
+
+    async def _edit(
+        self, bot: Bot, inline_message_id: str, state: MessageState, counts: Counts
+    ) -> None:
+        """ Show counts in keyboard, on failure mark state for the next attempt """
+        loop = asyncio.get_running_loop()
+        try:
+            await bot.edit_message_reply_markup(
+                inline_message_id=inline_message_id,
+                reply_markup=self.render(counts),
+            )
+        except error.RetryAfter as e:
+            logger.warning('Flood limit for %s: %s', inline_message_id, e)
+            self._retry_later(state, float(e.retry_after))
+            return
+        except error.BadRequest as e:
+            state.last_edit = loop.time()
+            if 'not modified' not in str(e):
+                # e.g. message was deleted, nothing to retry here
+                logger.warning('Cannot edit %s: %s', inline_message_id, e)
+                return
+        except error.TelegramError as e:
+            # network error or timeout, counters are pushed again later
+            state.failures += 1
+            if state.failures > self.max_retries:
+                logger.warning('Gave up editing %s: %s', inline_message_id, e)
+                state.failures = 0
+                return
+            backoff = self.min_interval * (2 ** state.failures - 1)
+            logger.warning('Cannot edit %s, retry in %.1f s: %s', inline_message_id, backoff, e)
+            self._retry_later(state, backoff)
+            return
+        state.failures = 0
+        state.last_counts = counts
+        state.last_edit = loop.time()
+
+    @staticmethod
+    def _retry_later(state: MessageState, delay: float) -> None:
+        """ Next edit goes `delay` seconds after min_interval """
+        state.dirty = True
+        state.last_edit = asyncio.get_running_loop().time() + delay
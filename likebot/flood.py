@@ -0,0 +1,48 @@
+import time
+from collections import OrderedDict
+from typing import Hashable, Tuple
+
+
+class ClickLimiter:
+    """
+    Token bucket per key, e.g. (user, message), in front of the database
+
+    Every key may click `burst` times at once and then `rate` times per
+    second. Only keys clicked during the last `burst / rate` seconds are
+    kept: older bucket is full again and equals to a new one. At most
+    `max_keys` buckets are stored, the least recently clicked go first.
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 100000) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.refill_time = burst / rate if rate > 0 else float('inf')
+        # tokens left and time of last click
+        self._buckets: 'OrderedDict[Hashable, Tuple[float, float]]' = OrderedDict()
+
+    def allow(self, key: Hashable) -> bool:
+        """ Take one token of key, False when the key is over limit """
+        if self.burst <= 0:
+            return True
+        now = time.monotonic()
+        self._evict(now)
+        tokens, updated = self._buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self._buckets[key] = (tokens, now)
+        return allowed
+
+    def _evict(self, now: float) -> None:
+        """ Forget refilled buckets and the oldest ones over max_keys """
+        buckets = self._buckets
+        while buckets:
+            key, (_, updated) = next(iter(buckets.items()))
+            if len(buckets) < self.max_keys and now - updated < self.refill_time:
+                return
+            del buckets[key]
+
+    def __len__(self) -> int:
+        return len(self._buckets)
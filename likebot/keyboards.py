@@ -0,0 +1,26 @@
+from functools import lru_cache
+from itertools import zip_longest
+from typing import Tuple
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from likebot.config import LIKE_REACTIONS
+
+# keyboards for this many distinct counter combinations are kept in memory
+KEYBOARD_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+def get_keyboard(counts: Tuple[int, ...] = ()) -> InlineKeyboardMarkup:
+    """
+    Create InlineKeyboardMarkup for adding as reaction to post
+
+    Markup objects are immutable, so the same object is reused for every
+    message with the same counters.
+    """
+    buttons = []
+    for (reaction, button), count in zip_longest(LIKE_REACTIONS.items(), counts):
+        if count:
+            button = f'{button} {count}'
+        buttons.append(InlineKeyboardButton(button, callback_data=reaction))
+    return InlineKeyboardMarkup([buttons])
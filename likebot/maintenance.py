@@ -0,0 +1,144 @@
+"""
+Bulk reads and writes of LikeDatabase used by analytics and resharding
+
+Writes hold the lock of the database and commit on their own, so they can
+run next to the bot in the same process. Reads use separate read-only
+connections and do not block it.
+"""
+import time
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from common.metrics import DB_SECONDS
+from likebot.database import LikeDatabase, fetch_counts
+
+# inline_message_id, created, archived_at and counters of archived post
+Message = Tuple[str, Optional[int], Optional[int], Dict[str, int]]
+# day, inline_message_id, reaction and net change of counter during the day
+DailyCount = Tuple[int, str, str, int]
+
+
+def iter_votes(database: LikeDatabase) -> Iterator[Tuple[str, int, str, Optional[int]]]:
+    """ Stream all votes as (inline_message_id, user_id, reaction, voted_at) """
+    conn = database.connect_reader()
+    try:
+        yield from conn.execute(
+            'SELECT message.inline_message_id, vote.user_id, reaction.name, vote.voted_at '
+            'FROM vote '
+            'JOIN message ON message.id = vote.message_id '
+            'JOIN reaction ON reaction.id = vote.reaction_id'
+        )
+    finally:
+        conn.close()
+
+
+def iter_messages(database: LikeDatabase) -> Iterator[Message]:
+    """ Stream all posts, counters are read for archived ones only """
+    conn = database.connect_reader()
+    try:
+        for message_id, created, archived_at in conn.execute(
+            'SELECT inline_message_id, created, archived_at FROM message'
+        ):
+            counts = fetch_counts(conn, message_id) if archived_at else {}
+            yield message_id, created, archived_at, counts
+    finally:
+        conn.close()
+
+
+def iter_daily(database: LikeDatabase) -> Iterator[DailyCount]:
+    """ Stream all rows of daily rollup """
+    conn = database.connect_reader()
+    try:
+        yield from conn.execute(
+            'SELECT vote_daily.day, message.inline_message_id, reaction.name, vote_daily.count '
+            'FROM vote_daily '
+            'JOIN message ON message.id = vote_daily.message_id '
+            'JOIN reaction ON reaction.id = vote_daily.reaction_id'
+        )
+    finally:
+        conn.close()
+
+
+def is_empty(database: LikeDatabase) -> bool:
+    with database.lock:
+        return database.conn.execute('SELECT 1 FROM message LIMIT 1').fetchone() is None
+
+
+def restore_messages(database: LikeDatabase, messages: Iterable[Message]) -> None:
+    """ Add posts copied from other database, counters are set for archived posts only """
+    with database.lock:
+        for message_id, created, archived_at, counts in messages:
+            database.conn.execute(
+                'INSERT OR IGNORE INTO message(inline_message_id, created, archived_at) '
+                'VALUES (?, ?, ?)',
+                (message_id, created, archived_at),
+            )
+            database.conn.executemany(
+                'INSERT OR REPLACE INTO vote_count(message_id, reaction_id, count) '
+                'SELECT id, ?, ? FROM message WHERE inline_message_id=?',
+                [
+                    (database.reactions[name], count, message_id)
+                    for name, count in counts.items()
+                ],
+            )
+        database.conn.commit()
+
+
+def restore_daily(database: LikeDatabase, rows: Iterable[DailyCount]) -> None:
+    """
+    Copy rollup rows of other database over the ones written by triggers
+
+    Triggers count only the last vote of every user, rows copied as they
+    are keep history of changed votes and of archived posts.
+    """
+    with database.lock:
+        database.conn.executemany(
+            'INSERT OR REPLACE INTO vote_daily(day, message_id, reaction_id, count) '
+            'SELECT ?, id, ?, ? FROM message WHERE inline_message_id=?',
+            [
+                (day, database.reactions[reaction], count, message_id)
+                for day, message_id, reaction, count in rows
+            ],
+        )
+        database.conn.commit()
+
+
+def archive_inactive(database: LikeDatabase, before: int, batch_size: int = 1000) -> int:
+    """
+    Freeze counters of posts without votes since `before` timestamp
+
+    Age of post without vote times, e.g. migrated one, counts from
+    `created`. Posts are checked in batches, each in own transaction
+    under the lock, so the bot keeps writing votes in between.
+    Returns number of archived posts.
+    """
+    now = int(time.time())
+    archived = last_id = 0
+    conn = database.conn
+    while True:
+        with database.lock, DB_SECONDS.time('archive'):
+            database.flush()
+            rows = conn.execute(
+                'SELECT id, COALESCE((SELECT MAX(voted_at) FROM vote '
+                'WHERE vote.message_id = message.id), created) FROM message '
+                'WHERE id > ? AND archived_at IS NULL ORDER BY id LIMIT ?',
+                (last_id, batch_size),
+            ).fetchall()
+            if not rows:
+                return archived
+            last_id = rows[-1][0]
+            ids = [row[0] for row in rows if row[1] is not None and row[1] < before]
+            if not ids:
+                continue
+            marks = ','.join('?' * len(ids))
+            conn.execute(f'UPDATE message SET archived_at = ? WHERE id IN ({marks})', (now, *ids))
+            conn.execute(f'DELETE FROM vote WHERE message_id IN ({marks})', ids)
+            conn.commit()
+            archived += len(ids)
+
+
+def vacuum(database: LikeDatabase) -> None:
+    """ Give free pages back to file system, blocks every other connection """
+    with database.lock:
+        database.flush()
+        database.conn.execute('VACUUM')
+        database.conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
@@ -0,0 +1,61 @@
+"""
+Create or upgrade vote databases of every shard and exit
+
+Run once before starting several bot processes on the same files, see
+common.dispatcher, so they do not run the migration at the same time.
+Votes of the first bot version, `like` table with text keys, are moved
+here at once and the file is shrunk after that. Bot started on such
+database moves them in background instead, see likebot.text_keys.
+
+    python -m likebot.migrate
+"""
+import logging
+import sqlite3
+
+from common.log import setup_logging
+from likebot import text_keys
+from likebot.config import LIKE_DB_SHARDS
+from likebot.schema import SCHEMA
+from likebot.sharding import open_shards, shard_file_name
+
+logger = logging.getLogger(__name__)
+
+# rows moved from old layout per transaction
+BATCH_SIZE = 10000
+
+
+def migrate_text_keys(file_name: str, batch_size: int = BATCH_SIZE) -> int:
+    """ Move all votes of `like` table with text keys into `vote`, returns their number """
+    conn = sqlite3.connect(file_name)
+    moved = 0
+    try:
+        conn.execute('PRAGMA journal_mode=WAL')
+        for statement in SCHEMA:
+            conn.execute(statement)
+        if not text_keys.prepare(conn):
+            return 0
+        reactions = dict(conn.execute('SELECT name, id FROM reaction').fetchall())
+        while True:
+            count = text_keys.move_batch(conn, reactions, batch_size)
+            conn.commit()
+            if not count:
+                break
+            moved += count
+            logger.info('Moved %s votes of %s', moved, file_name)
+        # old table is gone, give its pages back to the file system
+        conn.execute('VACUUM')
+    finally:
+        conn.close()
+    return moved
+
+
+def migrate() -> None:
+    for index in range(LIKE_DB_SHARDS):
+        migrate_text_keys(shard_file_name(index, LIKE_DB_SHARDS))
+    for database in open_shards(LIKE_DB_SHARDS):
+        database.close()
+
+
+if __name__ == '__main__':
+    setup_logging()
+    migrate()
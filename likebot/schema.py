@@ -0,0 +1,63 @@
+"""
+SQLite schema of likebot, see LikeDatabase.migrate for older versions
+"""
+
+SCHEMA = (
+    # inline_message_id is long text, it is stored once and votes refer to it by id
+    # created is time of the first vote, archived posts keep only counters
+    'CREATE TABLE IF NOT EXISTS message '
+    '(id integer PRIMARY KEY, inline_message_id text NOT NULL UNIQUE, '
+    'created integer, archived_at integer)',
+    'CREATE TABLE IF NOT EXISTS reaction (id integer PRIMARY KEY, name text NOT NULL UNIQUE)',
+    'CREATE TABLE IF NOT EXISTS vote '
+    '(message_id integer, user_id integer, reaction_id integer NOT NULL, voted_at integer, '
+    'PRIMARY KEY (message_id, user_id)) WITHOUT ROWID',
+    # materialized counters, one row per (message, reaction)
+    'CREATE TABLE IF NOT EXISTS vote_count '
+    '(message_id integer, reaction_id integer, count integer NOT NULL, '
+    'PRIMARY KEY (message_id, reaction_id)) WITHOUT ROWID',
+    # counters are changed by triggers, so they are always written
+    # in the same transaction as the vote itself
+    'CREATE TRIGGER IF NOT EXISTS vote_count_insert AFTER INSERT ON vote '
+    'BEGIN '
+    'INSERT INTO vote_count(message_id, reaction_id, count) '
+    'VALUES (NEW.message_id, NEW.reaction_id, 1) '
+    'ON CONFLICT(message_id, reaction_id) DO UPDATE SET count = count + 1; '
+    'END',
+    'CREATE TRIGGER IF NOT EXISTS vote_count_update AFTER UPDATE OF reaction_id ON vote '
+    'WHEN OLD.reaction_id IS NOT NEW.reaction_id '
+    'BEGIN '
+    'UPDATE vote_count SET count = count - 1 '
+    'WHERE message_id = OLD.message_id AND reaction_id = OLD.reaction_id; '
+    'INSERT INTO vote_count(message_id, reaction_id, count) '
+    'VALUES (NEW.message_id, NEW.reaction_id, 1) '
+    'ON CONFLICT(message_id, reaction_id) DO UPDATE SET count = count + 1; '
+    'END',
+)
+
+# created after migration, old databases get timestamp columns there
+ROLLUP_SCHEMA = (
+    'CREATE INDEX IF NOT EXISTS message_created ON message(created) '
+    'WHERE archived_at IS NULL',
+    # net change of every counter per UTC day, votes without time are skipped
+    'CREATE TABLE IF NOT EXISTS vote_daily '
+    '(day integer, message_id integer, reaction_id integer, count integer NOT NULL, '
+    'PRIMARY KEY (day, message_id, reaction_id)) WITHOUT ROWID',
+    'CREATE TRIGGER IF NOT EXISTS vote_daily_insert AFTER INSERT ON vote '
+    'WHEN NEW.voted_at IS NOT NULL '
+    'BEGIN '
+    'INSERT INTO vote_daily(day, message_id, reaction_id, count) '
+    'VALUES (NEW.voted_at / 86400, NEW.message_id, NEW.reaction_id, 1) '
+    'ON CONFLICT(day, message_id, reaction_id) DO UPDATE SET count = count + 1; '
+    'END',
+    'CREATE TRIGGER IF NOT EXISTS vote_daily_update AFTER UPDATE OF reaction_id ON vote '
+    'WHEN OLD.reaction_id IS NOT NEW.reaction_id AND NEW.voted_at IS NOT NULL '
+    'BEGIN '
+    'INSERT INTO vote_daily(day, message_id, reaction_id, count) '
+    'VALUES (NEW.voted_at / 86400, NEW.message_id, OLD.reaction_id, -1) '
+    'ON CONFLICT(day, message_id, reaction_id) DO UPDATE SET count = count - 1; '
+    'INSERT INTO vote_daily(day, message_id, reaction_id, count) '
+    'VALUES (NEW.voted_at / 86400, NEW.message_id, NEW.reaction_id, 1) '
+    'ON CONFLICT(day, message_id, reaction_id) DO UPDATE SET count = count + 1; '
+    'END',
+)
@@ -0,0 +1,196 @@
+"""
+Spread votes over several SQLite files so writes are not limited by one lock
+
+Message goes to shard by stable hash of its inline_message_id, all votes
+and counters of one message live in the same file. Data is copied to
+empty files of different number of shards, source files stay as they are:
+
+    python -m likebot.sharding <from shards> <to shards>
+"""
+import logging
+import sys
+import zlib
+from collections import defaultdict
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+from common.log import setup_logging
+from likebot.database import LikeDatabase
+from likebot.maintenance import (
+    is_empty,
+    iter_daily,
+    iter_messages,
+    iter_votes,
+    restore_daily,
+    restore_messages,
+)
+
+if TYPE_CHECKING:
+    from likebot.async_database import AsyncLikeDatabase
+
+logger = logging.getLogger(__name__)
+
+Row = TypeVar('Row')
+
+
+def shard_index(message_id: str, shards: int) -> int:
+    """ Stable between runs and processes, unlike builtin hash() """
+    return zlib.crc32(message_id.encode()) % shards
+
+
+def shard_file_name(index: int, shards: int) -> str:
+    if shards == 1:
+        # keep single shard setup compatible with existing like.db
+        return LikeDatabase.DATABASE_FILE_NAME
+    return LikeDatabase.DATABASE_FILE_NAME.replace('.db', f'-{index}-of-{shards}.db')
+
+
+def open_shards(
+    shards: int, batch_size: int = 1, batch_interval: float = 0.0
+) -> List[LikeDatabase]:
+    return [
+        LikeDatabase(shard_file_name(index, shards), batch_size, batch_interval)
+        for index in range(shards)
+    ]
+
+
+class ShardedLikeDatabase:
+    """ LikeDatabase interface on top of several shards """
+
+    def __init__(self, shards: Sequence[LikeDatabase]) -> None:
+        self.shards = shards
+
+    def shard(self, message_id: str) -> LikeDatabase:
+        return self.shards[shard_index(message_id, len(self.shards))]
+
+    def check_exists(self, message_id: str, user_id: int) -> bool:
+        return self.shard(message_id).check_exists(message_id, user_id)
+
+    def get_counts(self, message_id: str) -> Dict[str, int]:
+        return self.shard(message_id).get_counts(message_id)
+
+    def load_message(self, message_id: str) -> Tuple[Dict[int, str], Dict[str, int]]:
+        return self.shard(message_id).load_message(message_id)
+
+    def get_count(self, message_id: str, reaction: str) -> Union[str, int]:
+        return self.shard(message_id).get_count(message_id, reaction)
+
+    def add_reaction(
+        self, message_id: str, user_id: int, reaction: str, voted_at: Optional[int] = None
+    ) -> bool:
+        return self.shard(message_id).add_reaction(message_id, user_id, reaction, voted_at)
+
+    def flush(self) -> None:
+        for shard in self.shards:
+            shard.flush()
+
+    def close(self) -> None:
+        for shard in self.shards:
+            shard.close()
+
+
+class AsyncShardedLikeDatabase:
+    """ AsyncLikeDatabase interface on top of several shards, each with own threads """
+
+    def __init__(self, shards: Sequence['AsyncLikeDatabase']) -> None:
+        self.shards = shards
+
+    def shard(self, message_id: str) -> 'AsyncLikeDatabase':
+        return self.shards[shard_index(message_id, len(self.shards))]
+
+    async def check_exists(self, message_id: str, user_id: int) -> bool:
+        return await self.shard(message_id).check_exists(message_id, user_id)
+
+    async def get_counts(self, message_id: str) -> Dict[str, int]:
+        return await self.shard(message_id).get_counts(message_id)
+
+    async def load_message(self, message_id: str) -> Tuple[Dict[int, str], Dict[str, int]]:
+        return await self.shard(message_id).load_message(message_id)
+
+    async def get_count(self, message_id: str, reaction: str) -> Union[str, int]:
+        return await self.shard(message_id).get_count(message_id, reaction)
+
+    async def add_reaction(self, message_id: str, user_id: int, reaction: str) -> bool:
+        return await self.shard(message_id).add_reaction(message_id, user_id, reaction)
+
+    async def close(self) -> None:
+        for shard in self.shards:
+            await shard.close()
+
+
+def _copy(
+    rows: Iterable[Row],
+    key: Callable[[Row], str],
+    target: ShardedLikeDatabase,
+    restore: Callable[[LikeDatabase, List[Row]], None],
+    batch_size: int,
+) -> None:
+    """ Write rows to shards of their messages, up to batch_size rows per transaction """
+    batches: Dict[int, List[Row]] = defaultdict(list)
+    for row in rows:
+        index = shard_index(key(row), len(target.shards))
+        batch = batches[index]
+        batch.append(row)
+        if len(batch) >= batch_size:
+            restore(target.shards[index], batch)
+            batch.clear()
+    for index, batch in batches.items():
+        if batch:
+            restore(target.shards[index], batch)
+
+
+def reshard(source_shards: int, target_shards: int, batch_size: int = 10000) -> int:
+    """
+    Copy all votes from one shard layout to another, returns number of votes
+
+    Target shards must be empty, votes copied twice would count twice.
+    """
+    if source_shards == target_shards:
+        raise ValueError('Source and target layouts are the same')
+    sources = open_shards(source_shards)
+    reactions = {name for source in sources for name in source.reactions}
+    # votes are streamed, target shards commit once per batch_size votes
+    target = ShardedLikeDatabase(
+        [
+            LikeDatabase(shard_file_name(index, target_shards), batch_size, 60, reactions)
+            for index in range(target_shards)
+        ]
+    )
+    copied = 0
+    try:
+        if any(source.migrating for source in sources):
+            raise ValueError('Old votes are not moved yet, run `python -m likebot.migrate`')
+        if not all(is_empty(shard) for shard in target.shards):
+            raise ValueError(f'Target shards of {target_shards} layout are not empty')
+        for source in sources:
+            # posts first: they keep creation time, archived ones keep counters
+            _copy(iter_messages(source), lambda row: row[0], target, restore_messages, batch_size)
+            for message_id, user_id, reaction, voted_at in iter_votes(source):
+                target.add_reaction(message_id, user_id, reaction, voted_at)
+                copied += 1
+        # rollups last, they replace the rows written by vote triggers
+        for source in sources:
+            _copy(iter_daily(source), lambda row: row[1], target, restore_daily, batch_size)
+    finally:
+        target.close()
+        for source in sources:
+            source.close()
+    return copied
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit(__doc__)
+    setup_logging()
+    votes = reshard(int(sys.argv[1]), int(sys.argv[2]))
+    logger.info('Copied %s votes from %s to %s shards', votes, sys.argv[1], sys.argv[2])
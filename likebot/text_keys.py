@@ -0,0 +1,76 @@
+"""
+Move votes of the first bot version from `like` table with text keys
+
+LikeDatabase moves them in background while the bot runs, and moves votes
+of a post right before the post is used, so counters are always complete.
+`python -m likebot.migrate` moves all of them at once with the bot stopped.
+Counters are rebuilt by triggers on `vote`.
+"""
+import sqlite3
+import time
+from typing import Dict, List, Tuple
+
+Row = Tuple[int, str, int, str]
+
+
+def prepare(conn: sqlite3.Connection) -> bool:
+    """ Register reactions of old votes, False if there is nothing to move """
+    c = conn.cursor()
+    if not c.execute("SELECT 1 FROM sqlite_master WHERE name = 'like'").fetchone():
+        return False
+    c.execute('DROP TRIGGER IF EXISTS like_count_insert')
+    c.execute('DROP TRIGGER IF EXISTS like_count_update')
+    c.executemany(
+        'INSERT OR IGNORE INTO reaction(name) VALUES (?)',
+        c.execute('SELECT DISTINCT reaction FROM like').fetchall(),
+    )
+    conn.commit()
+    return True
+
+
+def _insert(conn: sqlite3.Connection, reactions: Dict[str, int], rows: List[Row]) -> None:
+    # age of old posts is counted from upgrade
+    now = int(time.time())
+    conn.executemany(
+        'INSERT OR IGNORE INTO message(inline_message_id, created) VALUES (?, ?)',
+        [(row[1], now) for row in rows],
+    )
+    # vote given after upgrade wins over the old one
+    conn.executemany(
+        'INSERT OR IGNORE INTO vote(message_id, user_id, reaction_id) '
+        'SELECT id, ?, ? FROM message WHERE inline_message_id=?',
+        [(row[2], reactions[row[3]], row[1]) for row in rows],
+    )
+
+
+def move_message(conn: sqlite3.Connection, reactions: Dict[str, int], message_id: str) -> int:
+    """ Move old votes of one post, returns their number """
+    rows = conn.execute(
+        'SELECT rowid, message_id, user_id, reaction FROM like WHERE message_id=?',
+        (message_id,),
+    ).fetchall()
+    if rows:
+        _insert(conn, reactions, rows)
+        conn.execute('DELETE FROM like WHERE message_id=?', (message_id,))
+    return len(rows)
+
+
+def move_batch(conn: sqlite3.Connection, reactions: Dict[str, int], batch_size: int) -> int:
+    """
+    Move up to batch_size old votes, returns their number
+
+    Rows are deleted from the old table as they go, so moving continues
+    from the same place after restart. Old tables are dropped when they
+    are empty. Caller commits.
+    """
+    rows = conn.execute(
+        'SELECT rowid, message_id, user_id, reaction FROM like ORDER BY rowid LIMIT ?',
+        (batch_size,),
+    ).fetchall()
+    if not rows:
+        conn.execute('DROP TABLE like')
+        conn.execute('DROP TABLE IF EXISTS like_count')
+        return 0
+    _insert(conn, reactions, rows)
+    conn.execute('DELETE FROM like WHERE rowid <= ?', (rows[-1][0],))
+    return len(rows)
@@ -1,13 +1,6 @@
 import logging
 
-from telegram import (
-    InlineKeyboardButton,
-    InlineKeyboardMarkup,
-    KeyboardButton,
-    ReplyKeyboardMarkup,
-    ReplyKeyboardRemove,
-    Update,
-)
+from telegram import Update
 from telegram.constants import ParseMode
 from telegram.ext import (
     CallbackContext,
@@ -18,8 +11,25 @@ from telegram.ext import (
     Application,
 )
 
-from showroombot.config import TELEGRAM_BOT_TOKEN
-from showroombot.file_processor import process_file_command, send_botfather_command
+from common.log import setup_logging
+from common.metrics import instrument_handlers
+from common.outbound import PriorityRateLimiter
+from common.transport import application_builder
+from common.update_processor import KeyedUpdateProcessor, drain_updates
+from common.webhook import run
+from showroombot.config import ALLOWED_UPDATES, TELEGRAM_BOT_TOKEN
+from showroombot.file_processor import (
+    process_file_command,
+    send_botfather_command,
+    warm_up,
+)
+from showroombot.keyboards import (
+    BUTTON_SEND_TEXT_TO_CHAT,
+    FILE_KEYBOARD,
+    INLINE_KEYBOARD,
+    REMOVE_KEYBOARD,
+    SIMPLE_KEYBOARD,
+)
 from showroombot.text import (
     command_tutorial_text,
     file_text,
@@ -29,25 +39,22 @@ from showroombot.text import (
     inline_text,
     keyboard_text,
 )
+from templatebot.utils import stats_command_handler
 
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.DEBUG
-)
+setup_logging()
 
 logger = logging.getLogger(__name__)
 
-BUTTON_SEND_TEXT_TO_CHAT = 'Отправить текст с кнопки в чат'
-
 
 async def start(update: Update, _: CallbackContext) -> None:
     name = update.message.from_user.first_name
     if not name:
         name = 'Anonymous user'
-    await update.message.reply_text(get_start_text(name), reply_markup=ReplyKeyboardRemove())
+    await update.message.reply_text(get_start_text(name), reply_markup=REMOVE_KEYBOARD)
 
 
 async def command_tutorial_handler(update: Update, context: CallbackContext) -> None:
-    await update.message.reply_text(command_tutorial_text, reply_markup=ReplyKeyboardRemove())
+    await update.message.reply_text(command_tutorial_text, reply_markup=REMOVE_KEYBOARD)
     await send_botfather_command(context.bot, update.message.chat.id)
 
 
@@ -56,41 +63,20 @@ async def help_command(update: Update, _: CallbackContext) -> None:
 
 
 async def keyboard_command(update: Update, context: CallbackContext) -> None:
-    keyboard = ReplyKeyboardMarkup(
-        [
-            [KeyboardButton(BUTTON_SEND_TEXT_TO_CHAT)],
-            [KeyboardButton('Можно со смайликами 😍')],
-            [KeyboardButton('Запросить номер телефона', request_contact=True)],
-            [KeyboardButton('Запросить местоположение', request_location=True)],
-        ],
-        resize_keyboard=True,
-        one_time_keyboard=True,
-    )
-
     await context.bot.send_message(
         update.message.chat.id,
         keyboard_text,
-        reply_markup=keyboard,
+        reply_markup=SIMPLE_KEYBOARD,
         parse_mode=ParseMode.MARKDOWN,
         disable_web_page_preview=True,
     )
 
 
 async def inline_keyboard_command(update: Update, context: CallbackContext) -> None:
-    keyboard = InlineKeyboardMarkup(
-        [
-            [
-                InlineKeyboardButton('👍', callback_data='like'),
-                InlineKeyboardButton('👎', callback_data='dislike'),
-            ],
-            [InlineKeyboardButton('Нажми чтобы изменить', callback_data='edit')],
-        ]
-    )
-
     await context.bot.send_message(
         update.message.chat.id,
         inline_text,
-        reply_markup=keyboard,
+        reply_markup=INLINE_KEYBOARD,
         parse_mode=ParseMode.MARKDOWN,
         disable_web_page_preview=True,
     )
@@ -123,26 +109,10 @@ async def inline_handler(update: Update, context: CallbackContext) -> None:
 
 
 async def file_command(update: Update, context: CallbackContext) -> None:
-    keyboard = InlineKeyboardMarkup(
-        [
-            [
-                InlineKeyboardButton(
-                    'Прислать изображение', callback_data='upload_png'
-                ),
-            ],
-            [
-                InlineKeyboardButton('Прислать видео', callback_data='upload_video'),
-            ],
-            [
-                InlineKeyboardButton('Прислать mp3', callback_data='upload_audio'),
-            ],
-        ]
-    )
-
     await context.bot.send_message(
         update.message.chat.id,
         file_text,
-        reply_markup=keyboard,
+        reply_markup=FILE_KEYBOARD,
         parse_mode=ParseMode.MARKDOWN,
         disable_web_page_preview=True,
     )
@@ -152,10 +122,17 @@ async def text_handler(update: Update, _: CallbackContext) -> None:
     await update.message.reply_text("Введите команду /start чтобы вернуться в основное меню.")
 
 
-def main() -> None:
-    """Start the bot."""
+def build_application() -> Application:
+    """ Create the Application with all handlers of the bot """
     # Create the Application and pass it your bot's token.
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    application = (
+        application_builder(TELEGRAM_BOT_TOKEN)
+        .concurrent_updates(KeyedUpdateProcessor())
+        .rate_limiter(PriorityRateLimiter())
+        .post_stop(drain_updates)
+        .post_init(warm_up)
+        .build()
+    )
 
     # on different commands - answer in Telegram
 
@@ -165,6 +142,7 @@ def main() -> None:
     application.add_handler(CommandHandler('command', command_tutorial_handler))
     application.add_handler(CommandHandler('inlinekeyboard', inline_keyboard_command))
     application.add_handler(CommandHandler('file', file_command))
+    application.add_handler(CommandHandler('stats', stats_command_handler))
     application.add_handler(CallbackQueryHandler(inline_handler))
 
     application.add_handler(
@@ -177,8 +155,14 @@ def main() -> None:
         MessageHandler(filters.TEXT & ~filters.COMMAND, text_handler)  # type: ignore
     )
 
+    instrument_handlers(application)
+    return application
+
+
+def main() -> None:
+    """Start the bot."""
     # Run the bot until the user presses Ctrl-C
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    run(build_application(), allowed_updates=ALLOWED_UPDATES)
 
 
 if __name__ == '__main__':
@@ -1,5 +1,18 @@
 import base64
+import os
+
+from telegram import Update
 
 bot_secret = ''
 
-TELEGRAM_BOT_TOKEN = base64.b64decode(bot_secret).decode()
+TELEGRAM_BOT_TOKEN = (
+    os.environ.get('TELEGRAM_BOT_TOKEN') or base64.b64decode(bot_secret).decode()
+)
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY]
+
+# chat where files are uploaded on startup to get their file_id,
+# warm-up is skipped if it is not set
+CACHE_CHAT_ID = os.environ.get('CACHE_CHAT_ID')
+# how many files are uploaded at once and how long startup may wait for them
+WARM_UP_CONCURRENCY = int(os.environ.get('WARM_UP_CONCURRENCY', 2))
+WARM_UP_TIMEOUT = float(os.environ.get('WARM_UP_TIMEOUT', 60))
@@ -1,46 +1,98 @@
+import asyncio
+import fcntl
+import logging
 import pathlib
 from typing import Dict
 
 from telegram import Bot
+from telegram.ext import Application
 
-from common.file_uploader import Resource, ResourceType, upload
+from common.file_uploader import Resource, ResourceType, ensure_uploaded, upload
+from common.file_uploader.cache import FILE_ID_CACHE_FILE_NAME
+from showroombot.config import CACHE_CHAT_ID, WARM_UP_CONCURRENCY, WARM_UP_TIMEOUT
 
-FILE_STORAGE: Dict[str, Resource] = {}
+logger = logging.getLogger(__name__)
+
+DIRECTORY = pathlib.Path(__file__).parent.absolute()
+# taken by the process that uploads files on startup, see _warm_up_locked
+WARM_UP_LOCK_FILE = f'{FILE_ID_CACHE_FILE_NAME}.warm-up.lock'
+
+# every file bot can send, file_id is filled after first upload
+ASSETS: Dict[str, Resource] = {
+    'upload_png': Resource(
+        path=f'{DIRECTORY}/file_example/logo.png',
+        resource_type=ResourceType.PICTURE,
+    ),
+    'upload_video': Resource(
+        path=f'{DIRECTORY}/file_example/iron_man.mp4',
+        resource_type=ResourceType.VIDEO,
+    ),
+    'upload_audio': Resource(
+        path=f'{DIRECTORY}/file_example/audio.mp3',
+        resource_type=ResourceType.AUDIO,
+    ),
+    'botfather_commands': Resource(
+        path=f'{DIRECTORY}/file_example/botfather_commands.jpg',
+        resource_type=ResourceType.PICTURE,
+    ),
+}
 
 
 async def process_file_command(bot: Bot, chat_id: int, command: str) -> None:
-    resource = FILE_STORAGE.get(command)
-    if resource:
+    resource = ASSETS.get(command)
+    if not resource:
+        raise Exception('Unexpected command')
+    if resource.file_id:
         text = f'Файл уже загружен, отправляем используя file_id:\n {resource.file_id}'
     else:
         text = 'Загружаем новый файл'
-        directory = pathlib.Path(__file__).parent.absolute()
-        if command == 'upload_png':
-            resource = Resource(
-                path=f'{directory}/file_example/logo.png',
-                resource_type=ResourceType.PICTURE,
-            )
-        elif command == 'upload_video':
-            resource = Resource(
-                path=f'{directory}/file_example/iron_man.mp4',
-                resource_type=ResourceType.VIDEO,
-            )
-        elif command == 'upload_audio':
-            resource = Resource(
-                path=f'{directory}/file_example/audio.mp3',
-                resource_type=ResourceType.AUDIO,
-            )
-        else:
-            raise Exception('Unexpected command')
 
     await upload(bot, chat_id, resource, text)
-    FILE_STORAGE[command] = resource
 
 
 async def send_botfather_command(bot: Bot, chat_id: int) -> None:
-    directory = pathlib.Path(__file__).parent.absolute()
-    resource = Resource(
-        path=f'{directory}/file_example/botfather_commands.jpg',
-        resource_type=ResourceType.PICTURE,
-    )
-    await upload(bot, chat_id, resource)
+    await upload(bot, chat_id, ASSETS['botfather_commands'])
+
+
+async def _warm_up_locked(bot: Bot, chat_id: int) -> None:
+    """
+    Upload files missing in file_id cache, one process at a time
+
+    Every dispatcher worker warms up on start. The first one to take the lock
+    uploads the files, the next ones find their file_id in the shared cache.
+    """
+    semaphore = asyncio.Semaphore(WARM_UP_CONCURRENCY)
+
+    async def warm_up_resource(name: str, resource: Resource) -> None:
+        async with semaphore:
+            try:
+                await ensure_uploaded(bot, chat_id, resource)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception('Warm-up of %s failed', name)
+
+    with open(WARM_UP_LOCK_FILE, 'a', encoding='utf-8') as lock:
+        while True:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                await asyncio.sleep(0.1)
+        # lock is released when file is closed, also on timeout
+        await asyncio.gather(
+            *[warm_up_resource(name, resource) for name, resource in ASSETS.items()]
+        )
+
+
+async def warm_up(application: Application) -> None:
+    """ Upload all files on startup, so users never wait for upload from disk """
+    if not CACHE_CHAT_ID:
+        logger.info('CACHE_CHAT_ID is not set, skip files warm-up')
+        return
+    try:
+        await asyncio.wait_for(
+            _warm_up_locked(application.bot, int(CACHE_CHAT_ID)), WARM_UP_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        logger.warning('Files warm-up timed out')
+    ready = [name for name, resource in ASSETS.items() if resource.file_id]
+    logger.info('Files ready to send by file_id: %s', ready)
@@ -0,0 +1,50 @@
+"""
+Keyboards of showroombot do not depend on user or message,
+so they are built once on import and reused by every handler
+"""
+from telegram import (
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    KeyboardButton,
+    ReplyKeyboardMarkup,
+    ReplyKeyboardRemove,
+)
+
+BUTTON_SEND_TEXT_TO_CHAT = 'Отправить текст с кнопки в чат'
+
+REMOVE_KEYBOARD = ReplyKeyboardRemove()
+
+SIMPLE_KEYBOARD = ReplyKeyboardMarkup(
+    [
+        [KeyboardButton(BUTTON_SEND_TEXT_TO_CHAT)],
+        [KeyboardButton('Можно со смайликами 😍')],
+        [KeyboardButton('Запросить номер телефона', request_contact=True)],
+        [KeyboardButton('Запросить местоположение', request_location=True)],
+    ],
+    resize_keyboard=True,
+    one_time_keyboard=True,
+)
+
+INLINE_KEYBOARD = InlineKeyboardMarkup(
+    [
+        [
+            InlineKeyboardButton('👍', callback_data='like'),
+            InlineKeyboardButton('👎', callback_data='dislike'),
+        ],
+        [InlineKeyboardButton('Нажми чтобы изменить', callback_data='edit')],
+    ]
+)
+
+FILE_KEYBOARD = InlineKeyboardMarkup(
+    [
+        [
+            InlineKeyboardButton('Прислать изображение', callback_data='upload_png'),
+        ],
+        [
+            InlineKeyboardButton('Прислать видео', callback_data='upload_video'),
+        ],
+        [
+            InlineKeyboardButton('Прислать mp3', callback_data='upload_audio'),
+        ],
+    ]
+)
@@ -0,0 +1,14 @@
+"""
+Create file_id cache database and exit, see likebot/migrate.py
+
+    python -m showroombot.migrate
+"""
+from common.file_uploader.cache import FileIdCache
+
+
+def migrate() -> None:
+    FileIdCache().conn.close()
+
+
+if __name__ == '__main__':
+    migrate()
@@ -1,5 +1,5 @@
 import logging
-from uuid import uuid4
+from typing import List
 
 from telegram import (
     InlineQueryResultArticle,
@@ -14,13 +14,20 @@ from telegram.ext import (
     InlineQueryHandler,
     MessageHandler,
     Application,
+    filters,
 )
 
-from templatebot.config import TELEGRAM_BOT_TOKEN
+from common.inline import InlineAnswerer, result_id
+from common.log import setup_logging
+from common.metrics import instrument_handlers
+from common.outbound import PriorityRateLimiter
+from common.transport import application_builder
+from common.update_processor import KeyedUpdateProcessor, drain_updates
+from common.webhook import run
+from templatebot.config import ALLOWED_UPDATES, TELEGRAM_BOT_TOKEN
+from templatebot.utils import stats_command_handler
 
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.DEBUG
-)
+setup_logging()
 
 logger = logging.getLogger(__name__)
 
@@ -51,39 +58,52 @@ async def button_handler(update: Update, _: CallbackContext) -> None:
     await query.edit_message_text(query.data)
 
 
-async def inline_query_handler(update: Update, _: CallbackContext) -> None:
-    """ Handle the inline query. """
-    if not update.inline_query.query:
-        return
-
-    results = [
+def build_inline_results(text: str) -> List[InlineQueryResultArticle]:
+    """ Single article that sends query text back, replace with your results """
+    return [
         InlineQueryResultArticle(
-            id=str(uuid4()),
+            id=result_id(text),
             title='Do nothing',
             input_message_content=InputTextMessageContent(
-                update.inline_query.query, parse_mode=ParseMode.MARKDOWN
+                text, parse_mode=ParseMode.MARKDOWN
             ),
         ),
     ]
 
-    await update.inline_query.answer(results)  # type: ignore
 
+inline_answerer = InlineAnswerer(build_inline_results)
 
-def main() -> None:
-    """Start the bot."""
+
+def build_application() -> Application:
+    """ Create the Application with all handlers of the bot """
+    if not TELEGRAM_BOT_TOKEN:
+        raise RuntimeError('TELEGRAM_BOT_TOKEN is not set')
     # Create the Application and pass it your bot's token.
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    application = (
+        application_builder(TELEGRAM_BOT_TOKEN)
+        .concurrent_updates(KeyedUpdateProcessor())
+        .rate_limiter(PriorityRateLimiter())
+        .post_stop(drain_updates)
+        .build()
+    )
 
     application.add_handler(CommandHandler('start', start_command_handler))
-    application.add_handler(InlineQueryHandler(inline_query_handler))
+    application.add_handler(CommandHandler('stats', stats_command_handler))
+    application.add_handler(InlineQueryHandler(inline_answerer.handle))
     application.add_handler(CallbackQueryHandler(button_handler))
 
     application.add_handler(
         MessageHandler(filters.TEXT & ~filters.COMMAND, text_handler)  # type: ignore
     )
 
+    instrument_handlers(application)
+    return application
+
+
+def main() -> None:
+    """Start the bot."""
     # Run the bot until the user presses Ctrl-C
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    run(build_application(), allowed_updates=ALLOWED_UPDATES)
 
 
 if __name__ == '__main__':
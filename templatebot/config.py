@@ -1,5 +1,11 @@
 import os
 from typing import List
 
-TELEGRAM_BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN')
-ADMINS: List[str] = []
+from telegram import Update
+
+TELEGRAM_BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN', '')
+ALLOWED_UPDATES = [Update.MESSAGE, Update.INLINE_QUERY, Update.CALLBACK_QUERY]
+# telegram user ids, e.g. ADMINS=12345,67890
+ADMINS: List[int] = [
+    int(user_id) for user_id in os.environ.get('ADMINS', '').split(',') if user_id.strip()
+]
@@ -1,5 +1,17 @@
+from telegram import Update
+from telegram.ext import CallbackContext
+
+from common.metrics import stats_text
 from templatebot.config import ADMINS
 
 
 def is_admin(user_id: int) -> bool:
     return user_id in ADMINS
+
+
+async def stats_command_handler(update: Update, _: CallbackContext) -> None:
+    """ Send metrics summary, only to admins, other users get no answer """
+    user = update.effective_user
+    if not user or not update.message or not is_admin(user.id):
+        return
+    await update.message.reply_text(stats_text())
@@ -0,0 +1,8 @@
+import os
+import tempfile
+
+# bot modules open their databases on import, keep them out of the source tree
+_directory = tempfile.mkdtemp(prefix='bot-tests-')
+os.environ.setdefault('LIKE_DB_FILE_NAME', os.path.join(_directory, 'like.db'))
+os.environ.setdefault('FILE_ID_CACHE_FILE_NAME', os.path.join(_directory, 'file_id.db'))
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '123456:test')
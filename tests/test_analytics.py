@@ -0,0 +1,42 @@
+import os
+import time
+from pathlib import Path
+
+from likebot.analytics import DAY, archive, export_votes
+from likebot.database import LikeDatabase
+
+
+def test_archive_by_last_vote(tmp_path: Path) -> None:
+    database = LikeDatabase(os.path.join(tmp_path, 'like.db'), reactions=['like', 'dislike'])
+    old = int(time.time()) - 10 * DAY
+    try:
+        database.add_reaction('old', 1, 'like', voted_at=old)
+        database.add_reaction('old', 2, 'like', voted_at=old)
+        # created long ago, but still voted
+        database.add_reaction('active', 1, 'like', voted_at=old)
+        database.add_reaction('active', 2, 'dislike')
+
+        assert archive(database, days=5, batch_size=1) == 1
+        assert archive(database, days=5) == 0
+
+        assert database.get_counts('old') == {'like': 2}
+        assert not database.check_exists('old', 1)
+        # archived counters are frozen
+        assert not database.add_reaction('old', 3, 'dislike')
+        assert database.get_counts('old') == {'like': 2}
+        assert database.add_reaction('active', 3, 'like')
+        assert database.get_counts('active') == {'like': 2, 'dislike': 1}
+        assert len(list(export_votes([database]))) == 3
+    finally:
+        database.close()
+
+
+def test_archive_with_vacuum(tmp_path: Path) -> None:
+    database = LikeDatabase(os.path.join(tmp_path, 'like.db'), batch_size=100, batch_interval=60)
+    try:
+        database.add_reaction('old', 1, 'like', voted_at=int(time.time()) - 2 * DAY)
+        # vote waiting in write-behind batch is archived as well
+        assert archive(database, days=1, vacuum=True) == 1
+        assert database.get_counts('old') == {'like': 1}
+    finally:
+        database.close()
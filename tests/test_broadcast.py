@@ -0,0 +1,133 @@
+import asyncio
+import json
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+from telegram import error
+from telegram.ext import ExtBot
+from telegram.request import BaseRequest
+
+from common.file_uploader.broadcast import (
+    BROADCAST_RATE,
+    BroadcastResult,
+    _record,
+    _shared_bucket,
+    broadcast,
+    read_progress,
+)
+from common.file_uploader.upload import Resource, ResourceType
+from common.outbound import PriorityRateLimiter
+from common.rate_limit import TokenBucket
+
+
+def test_only_delivered_chats_are_done(tmp_path: Path) -> None:
+    progress_file = tmp_path / 'progress.tsv'
+    with open(progress_file, 'w') as progress:
+        _record(progress, BroadcastResult(1, True))
+        _record(progress, BroadcastResult(2, False, 'Timed out'))
+        _record(progress, BroadcastResult(3, False, 'Forbidden:\n bot was blocked'))
+        # failed in the first run, delivered after resume
+        _record(progress, BroadcastResult(2, True))
+
+    assert read_progress(str(progress_file)) == {1, 2}
+
+
+def test_missing_progress_file_means_nothing_is_done(tmp_path: Path) -> None:
+    assert read_progress(str(tmp_path / 'missing.tsv')) == set()
+    assert read_progress(None) == set()
+
+
+class StubBot:
+    """ Plain bot: each chat answers with the errors queued for it, then succeeds """
+
+    def __init__(self, errors: Dict[int, List[Exception]]) -> None:
+        self.token = '123456:test'
+        self.errors = errors
+        self.sent: List[int] = []
+
+    async def send_photo(self, chat_id: int, photo: object, **kwargs: Any) -> SimpleNamespace:
+        if self.errors.get(chat_id):
+            raise self.errors[chat_id].pop(0)
+        self.sent.append(chat_id)
+        return SimpleNamespace(photo=[SimpleNamespace(file_id='photo')])
+
+
+async def collect(bot: Any, chat_ids: List[int], **kwargs: Any) -> Dict[int, BroadcastResult]:
+    resource = Resource('', ResourceType.PICTURE, 'photo')
+    return {
+        result.chat_id: result
+        async for result in broadcast(bot, chat_ids, resource, **kwargs)
+    }
+
+
+def test_retry_after_is_retried_and_other_errors_are_not() -> None:
+    bot = StubBot({
+        2: [error.RetryAfter(0)],
+        3: [error.Forbidden('bot was blocked by the user')],
+        4: [error.BadRequest('Chat not found')],
+        5: [error.RetryAfter(0)] * 3,
+    })
+    results = asyncio.run(collect(bot, [1, 2, 3, 4, 5], max_retries=2))
+
+    assert sorted(bot.sent) == [1, 2]
+    assert [chat for chat, result in sorted(results.items()) if result.ok] == [1, 2]
+    assert results[3].error == 'bot was blocked by the user'
+    assert results[4].error == 'Chat not found'
+    assert 'Flood control exceeded' in str(results[5].error)
+
+
+def test_broadcasts_share_one_bucket() -> None:
+    async def scenario() -> Optional[TokenBucket]:
+        bot = StubBot({})
+        await asyncio.gather(collect(bot, [1, 2]), collect(bot, [3, 4]))
+        return _shared_bucket(bot)
+
+    bucket = asyncio.run(scenario())
+    assert bucket is not None
+    # four sends took tokens of the same bucket
+    assert bucket.tokens <= BROADCAST_RATE - 4 + 1
+
+
+class FloodedRequest(BaseRequest):
+    """ Bot API that answers every sendPhoto with flood limit """
+
+    def __init__(self) -> None:
+        self.sends = 0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(  # type: ignore[override]
+            self, url: str, method: str, *args: Any, **kwargs: Any
+    ) -> Tuple[int, bytes]:
+        if url.endswith('getMe'):
+            user = {'id': 123456, 'is_bot': True, 'first_name': 'Test', 'username': 'test_bot'}
+            return 200, json.dumps({'ok': True, 'result': user}).encode()
+        self.sends += 1
+        return 429, json.dumps({
+            'ok': False,
+            'error_code': 429,
+            'description': 'Too Many Requests: retry after 1',
+            'parameters': {'retry_after': 1},
+        }).encode()
+
+
+def test_rate_limiter_is_the_only_retry_layer() -> None:
+    request = FloodedRequest()
+
+    async def scenario() -> Dict[int, BroadcastResult]:
+        bot = ExtBot(
+            '123456:test', request=request, rate_limiter=PriorityRateLimiter(max_retries=1)
+        )
+        async with bot:
+            assert _shared_bucket(bot) is None
+            return await collect(bot, [1], max_retries=5)
+
+    results = asyncio.run(scenario())
+    assert not results[1].ok
+    # first try and one retry of the limiter, broadcast did not retry on top
+    assert request.sends == 2
@@ -0,0 +1,74 @@
+import asyncio
+from typing import Dict, List, Tuple
+
+from likebot.cache import MESSAGE_SIZE, VOTE_SIZE, ReactionCache
+
+
+class FakeStorage:
+    """ Votes in memory, loads take a while so concurrent clicks overlap """
+
+    def __init__(self) -> None:
+        self.votes: Dict[str, Dict[int, str]] = {}
+        self.loads: List[str] = []
+
+    async def load_message(self, message_id: str) -> Tuple[Dict[int, str], Dict[str, int]]:
+        self.loads.append(message_id)
+        await asyncio.sleep(0.01)
+        votes = dict(self.votes.get(message_id, {}))
+        counts: Dict[str, int] = {}
+        for reaction in votes.values():
+            counts[reaction] = counts.get(reaction, 0) + 1
+        return votes, counts
+
+    async def add_reaction(self, message_id: str, user_id: int, reaction: str) -> bool:
+        votes = self.votes.setdefault(message_id, {})
+        changed = votes.get(user_id) != reaction
+        votes[user_id] = reaction
+        return changed
+
+
+def test_concurrent_clicks_load_post_once() -> None:
+    async def scenario() -> None:
+        storage = FakeStorage()
+        cache = ReactionCache(storage, 10 ** 6, ttl=60)  # type: ignore[arg-type]
+        results = await asyncio.gather(
+            *(cache.add_reaction('post', user, 'like') for user in range(10))
+        )
+        assert all(results)
+        assert storage.loads == ['post']
+        assert await cache.get_counts('post') == {'like': 10}
+        assert not await cache.add_reaction('post', 3, 'like')
+        assert await cache.add_reaction('post', 3, 'dislike')
+        assert await cache.get_counts('post') == {'like': 9, 'dislike': 1}
+
+    asyncio.run(scenario())
+
+
+def test_least_recently_clicked_post_is_evicted() -> None:
+    async def scenario() -> None:
+        storage = FakeStorage()
+        budget = 2 * (MESSAGE_SIZE + VOTE_SIZE)
+        cache = ReactionCache(storage, budget, ttl=60)  # type: ignore[arg-type]
+        await cache.add_reaction('first', 1, 'like')
+        await cache.add_reaction('second', 1, 'like')
+        await cache.get_counts('first')
+        await cache.add_reaction('third', 1, 'like')
+        assert cache.size <= budget
+        assert cache.stats.evictions == 1
+        # counters of evicted post are loaded from the storage again
+        assert await cache.get_counts('second') == {'like': 1}
+        assert storage.loads == ['first', 'second', 'third', 'second']
+
+    asyncio.run(scenario())
+
+
+def test_expired_post_is_reloaded() -> None:
+    async def scenario() -> None:
+        storage = FakeStorage()
+        cache = ReactionCache(storage, 10 ** 6, ttl=0)  # type: ignore[arg-type]
+        await cache.add_reaction('post', 1, 'like')
+        storage.votes['post'][2] = 'dislike'
+        assert await cache.get_counts('post') == {'like': 1, 'dislike': 1}
+        assert storage.loads == ['post', 'post']
+
+    asyncio.run(scenario())
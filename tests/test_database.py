@@ -0,0 +1,58 @@
+import asyncio
+import os
+from pathlib import Path
+
+from likebot.async_database import AsyncLikeDatabase
+from likebot.database import LikeDatabase
+
+
+def test_counters_follow_changed_votes(tmp_path: Path) -> None:
+    database = LikeDatabase(os.path.join(tmp_path, 'like.db'))
+    try:
+        assert database.add_reaction('post', 1, 'like')
+        assert database.add_reaction('post', 2, 'like')
+        assert database.add_reaction('post', 3, 'dislike')
+        # the same reaction again changes nothing
+        assert not database.add_reaction('post', 1, 'like')
+        assert database.get_counts('post') == {'like': 2, 'dislike': 1}
+
+        assert database.add_reaction('post', 1, 'dislike')
+        assert database.get_counts('post') == {'like': 1, 'dislike': 2}
+        assert database.get_count('post', 'like') == 1
+        assert database.get_count('other', 'like') == ''
+    finally:
+        database.close()
+
+
+def test_readers_see_committed_votes(tmp_path: Path) -> None:
+    async def scenario() -> None:
+        storage = AsyncLikeDatabase(LikeDatabase(os.path.join(tmp_path, 'like.db')), readers=2)
+        try:
+            await asyncio.gather(
+                *(storage.add_reaction('post', user, 'like') for user in range(50))
+            )
+            assert await storage.add_reaction('post', 0, 'dislike')
+            assert await storage.get_counts('post') == {'like': 49, 'dislike': 1}
+            assert await storage.check_exists('post', 49)
+            votes, counts = await storage.load_message('post')
+            assert len(votes) == 50 and counts['dislike'] == 1
+        finally:
+            await storage.close()
+
+    asyncio.run(scenario())
+
+
+def test_write_behind_batch(tmp_path: Path) -> None:
+    file_name = os.path.join(tmp_path, 'like.db')
+    database = LikeDatabase(file_name, batch_size=100, batch_interval=60)
+    reader = database.connect_reader()
+    try:
+        database.add_reaction('post', 1, 'like')
+        # visible to the writer connection before commit
+        assert database.get_counts('post') == {'like': 1}
+        assert reader.execute('SELECT COUNT(*) FROM vote').fetchone()[0] == 0
+        database.flush()
+        assert reader.execute('SELECT COUNT(*) FROM vote').fetchone()[0] == 1
+    finally:
+        reader.close()
+        database.close()
@@ -0,0 +1,78 @@
+import asyncio
+from typing import Any, List, Tuple
+
+from telegram import InlineKeyboardMarkup, error
+
+from likebot.debounce import KeyboardDebouncer
+
+Counts = Tuple[int, ...]
+
+
+class FlakyBot:
+    """ Fails edits with given errors first, then records them """
+
+    def __init__(self, *errors: Exception) -> None:
+        self.errors = list(errors)
+        self.edits: List[Any] = []
+
+    async def edit_message_reply_markup(self, **kwargs: Any) -> bool:
+        if self.errors:
+            raise self.errors.pop(0)
+        self.edits.append(kwargs['reply_markup'])
+        return True
+
+
+def render(counts: Counts) -> InlineKeyboardMarkup:
+    return counts  # type: ignore[return-value]
+
+
+def run_refresh(bot: FlakyBot, counts: Counts) -> KeyboardDebouncer:
+    async def get_counts(_: str) -> Counts:
+        return counts
+
+    async def scenario() -> KeyboardDebouncer:
+        debouncer = KeyboardDebouncer(get_counts, render, min_interval=0.01)
+        debouncer.schedule(bot, 'post')  # type: ignore[arg-type]
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if debouncer._states['post'].task is None:  # pylint: disable=protected-access
+                break
+        return debouncer
+
+    return asyncio.run(scenario())
+
+
+def test_network_errors_are_retried() -> None:
+    bot = FlakyBot(error.NetworkError('connection reset'), error.TimedOut())
+    debouncer = run_refresh(bot, (3, 1))
+    assert bot.edits == [(3, 1)]
+    assert debouncer._states['post'].last_counts == (3, 1)  # pylint: disable=protected-access
+
+
+def test_not_modified_counts_as_shown() -> None:
+    bot = FlakyBot(error.BadRequest('Message is not modified'))
+    debouncer = run_refresh(bot, (2, 0))
+    assert not bot.edits
+    assert debouncer._states['post'].last_counts == (2, 0)  # pylint: disable=protected-access
+
+
+def test_failed_edit_is_not_remembered() -> None:
+    bot = FlakyBot(error.BadRequest('Message to edit not found'))
+    debouncer = run_refresh(bot, (2, 0))
+    assert not bot.edits
+    assert debouncer._states['post'].last_counts is None  # pylint: disable=protected-access
+
+
+def test_counters_error_is_logged(caplog: Any) -> None:
+    async def get_counts(_: str) -> Counts:
+        raise RuntimeError('database is locked')
+
+    async def scenario() -> KeyboardDebouncer:
+        debouncer = KeyboardDebouncer(get_counts, render, min_interval=0.01)
+        debouncer.schedule(FlakyBot(), 'post')  # type: ignore[arg-type]
+        await asyncio.sleep(0.05)
+        return debouncer
+
+    debouncer = asyncio.run(scenario())
+    assert debouncer._states['post'].task is None  # pylint: disable=protected-access
+    assert 'Cannot read counters of post' in caplog.text
@@ -0,0 +1,71 @@
+import asyncio
+from pathlib import Path
+
+from common.file_uploader.cache import FileIdCache, content_hash, file_id_cache
+from common.file_uploader.upload import Resource, ResourceType, ensure_uploaded, upload
+from tests.test_upload import StubBot, picture
+
+
+def test_file_id_is_kept_per_bot_hash_and_type(tmp_path: Path) -> None:
+    cache = FileIdCache(str(tmp_path / 'file_id.db'))
+    bot, other_bot = StubBot('1:first'), StubBot('2:second')
+    cache.set(bot, 'hash', ResourceType.PICTURE, 'photo')
+    cache.set(bot, 'hash', ResourceType.GIF, 'animation')
+
+    assert cache.get(bot, 'hash', ResourceType.PICTURE) == 'photo'
+    assert cache.get(bot, 'hash', ResourceType.GIF) == 'animation'
+    # file_id of other bot is not valid for this one
+    assert cache.get(other_bot, 'hash', ResourceType.PICTURE) is None
+    assert cache.get(bot, 'other hash', ResourceType.PICTURE) is None
+    # token secret is not part of the key
+    assert cache.get(StubBot('1:renewed'), 'hash', ResourceType.PICTURE) == 'photo'
+
+
+def test_only_stale_file_id_is_deleted(tmp_path: Path) -> None:
+    cache = FileIdCache(str(tmp_path / 'file_id.db'))
+    bot = StubBot()
+    cache.set(bot, 'hash', ResourceType.PICTURE, 'fresh')
+    cache.delete(bot, 'hash', ResourceType.PICTURE, 'stale')
+    assert cache.get(bot, 'hash', ResourceType.PICTURE) == 'fresh'
+    cache.delete(bot, 'hash', ResourceType.PICTURE, 'fresh')
+    assert cache.get(bot, 'hash', ResourceType.PICTURE) is None
+    # without file_id any entry is deleted
+    cache.set(bot, 'hash', ResourceType.PICTURE, 'fresh')
+    cache.delete(bot, 'hash', ResourceType.PICTURE)
+    assert cache.get(bot, 'hash', ResourceType.PICTURE) is None
+
+
+def test_cached_file_id_is_reused_by_content(tmp_path: Path) -> None:
+    path = picture(tmp_path)
+    copy = tmp_path / 'copy.jpg'
+    copy.write_bytes(Path(path).read_bytes())
+
+    async def scenario() -> None:
+        bot = StubBot()
+        await ensure_uploaded(bot, 1, Resource(path, ResourceType.PICTURE))
+        # the same content under other path is not uploaded again
+        resource = await ensure_uploaded(bot, 1, Resource(str(copy), ResourceType.PICTURE))
+        assert resource.file_id == 'uploaded-1'
+        assert bot.uploads == 1
+
+    asyncio.run(scenario())
+
+
+def test_stale_file_id_is_replaced_by_new_upload(tmp_path: Path) -> None:
+    path = picture(tmp_path)
+    file_hash = content_hash(path)
+
+    async def scenario() -> None:
+        bot = StubBot()
+        file_id_cache.set(bot, file_hash, ResourceType.PICTURE, 'stale')
+        bot.stale.add('stale')
+        resource = await upload(bot, 1, Resource(path, ResourceType.PICTURE))
+        assert resource.file_id == 'uploaded-1'
+        assert file_id_cache.get(bot, file_hash, ResourceType.PICTURE) == 'uploaded-1'
+        # new file_id is used from now on
+        resource = await upload(bot, 2, Resource(path, ResourceType.PICTURE))
+        assert resource.file_id == 'uploaded-1'
+        assert bot.uploads == 1
+        assert bot.sent == ['uploaded-1', 'uploaded-1']
+
+    asyncio.run(scenario())
@@ -0,0 +1,90 @@
+import asyncio
+import fcntl
+import uuid
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, List
+
+import pytest
+
+from common.file_uploader import Resource, ResourceType
+from showroombot import file_processor
+
+
+class StubBot:
+    """ Uploads of files named `broken*` fail, of `slow*` never finish """
+
+    def __init__(self) -> None:
+        self.token = '123456:test'
+        self.uploads: List[str] = []
+
+    async def send_photo(self, chat_id: int, photo: object, **kwargs: object) -> SimpleNamespace:
+        name = getattr(photo, 'filename', '')
+        self.uploads.append(name)
+        if name.startswith('broken'):
+            raise RuntimeError('Upload failed')
+        if name.startswith('slow'):
+            await asyncio.sleep(60)
+        return SimpleNamespace(photo=[SimpleNamespace(file_id=f'id-{name}')])
+
+
+@pytest.fixture
+def assets(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Dict[str, Resource]:
+    def asset(name: str) -> Resource:
+        # unique content, so file_id cached by another test is not reused
+        path = tmp_path / f'{name}.jpg'
+        path.write_bytes(uuid.uuid4().bytes)
+        return Resource(str(path), ResourceType.PICTURE)
+
+    files = {name: asset(name) for name in ('first', 'second', 'broken', 'slow')}
+    monkeypatch.setattr(file_processor, 'ASSETS', files)
+    monkeypatch.setattr(file_processor, 'CACHE_CHAT_ID', '-100')
+    monkeypatch.setattr(file_processor, 'WARM_UP_TIMEOUT', 0.5)
+    monkeypatch.setattr(file_processor, 'WARM_UP_LOCK_FILE', str(tmp_path / 'warm-up.lock'))
+    return files
+
+
+def warm_up(bot: StubBot) -> None:
+    asyncio.run(file_processor.warm_up(SimpleNamespace(bot=bot)))  # type: ignore[arg-type]
+
+
+def test_failed_and_slow_uploads_do_not_stop_startup(assets: Dict[str, Resource]) -> None:
+    bot = StubBot()
+    warm_up(bot)
+
+    assert sorted(bot.uploads) == ['broken.jpg', 'first.jpg', 'second.jpg', 'slow.jpg']
+    assert assets['first'].file_id == 'id-first.jpg'
+    assert assets['second'].file_id == 'id-second.jpg'
+    assert assets['broken'].file_id is None
+    assert assets['slow'].file_id is None
+
+
+def test_files_from_cache_are_not_uploaded_again(assets: Dict[str, Resource]) -> None:
+    warm_up(StubBot())
+    # next worker or restart of the bot
+    for resource in assets.values():
+        resource.file_id = None
+    bot = StubBot()
+    warm_up(bot)
+
+    assert sorted(bot.uploads) == ['broken.jpg', 'slow.jpg']
+    assert assets['first'].file_id == 'id-first.jpg'
+
+
+def test_warm_up_waits_for_other_process(assets: Dict[str, Resource]) -> None:
+    bot = StubBot()
+    with open(file_processor.WARM_UP_LOCK_FILE, 'a', encoding='utf-8') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        warm_up(bot)
+    # timed out waiting for the lock, the other process uploads files
+    assert not bot.uploads
+    assert all(resource.file_id is None for resource in assets.values())
+
+
+def test_warm_up_is_skipped_without_cache_chat(
+        assets: Dict[str, Resource], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(file_processor, 'CACHE_CHAT_ID', None)
+    bot = StubBot()
+    warm_up(bot)
+    assert not bot.uploads
@@ -0,0 +1,31 @@
+from unittest import mock
+
+from likebot.flood import ClickLimiter
+
+
+def test_burst_then_refill() -> None:
+    limiter = ClickLimiter(rate=1, burst=3)
+    with mock.patch('likebot.flood.time.monotonic', return_value=100.0) as monotonic:
+        assert [limiter.allow('key') for _ in range(4)] == [True, True, True, False]
+        # other keys have own buckets
+        assert limiter.allow('other')
+        monotonic.return_value = 101.0
+        assert limiter.allow('key')
+        assert not limiter.allow('key')
+
+
+def test_refilled_and_extra_keys_are_forgotten() -> None:
+    limiter = ClickLimiter(rate=1, burst=2, max_keys=3)
+    with mock.patch('likebot.flood.time.monotonic', return_value=100.0) as monotonic:
+        for key in range(5):
+            limiter.allow(key)
+        assert len(limiter) == 3
+        monotonic.return_value = 103.0
+        limiter.allow('new')
+        assert len(limiter) == 1
+
+
+def test_zero_burst_disables_limit() -> None:
+    limiter = ClickLimiter(rate=1, burst=0)
+    assert all(limiter.allow('key') for _ in range(100))
+    assert len(limiter) == 0
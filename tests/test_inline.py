@@ -0,0 +1,37 @@
+import asyncio
+from typing import Any, List
+
+from telegram import error
+
+from common.inline import InlineAnswerer
+
+
+class FakeQuery:
+    def __init__(self, exception: Exception) -> None:
+        self.id = '1'
+        self.query = 'text'
+        self.exception = exception
+
+    async def answer(self, *_: Any, **__: Any) -> None:
+        raise self.exception
+
+
+def test_telegram_errors_do_not_escape_answer() -> None:
+    answerer = InlineAnswerer(lambda text: [])
+    for exception in (error.BadRequest('Query is too old'), error.TimedOut()):
+        query: Any = FakeQuery(exception)
+        asyncio.run(answerer._answer(query))  # pylint: disable=protected-access
+
+
+def test_results_are_built_once_per_text() -> None:
+    built: List[str] = []
+
+    def build(text: str) -> List[Any]:
+        built.append(text)
+        return []
+
+    answerer = InlineAnswerer(build)
+    answerer.build_results('a')
+    answerer.build_results('a')
+    answerer.build_results('b')
+    assert built == ['a', 'b']
@@ -0,0 +1,85 @@
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+import pytest
+
+from likebot.config import parse_reactions
+from likebot.database import LikeDatabase
+from likebot.maintenance import iter_messages
+from likebot.migrate import migrate_text_keys
+
+
+def create_v1_database(file_name: str) -> None:
+    """ Layout of the first bot version: votes with text keys """
+    conn = sqlite3.connect(file_name)
+    conn.execute(
+        'CREATE TABLE like '
+        '(message_id text, user_id integer, reaction text, PRIMARY KEY (message_id, user_id))'
+    )
+    conn.executemany(
+        'INSERT INTO like VALUES (?, ?, ?)',
+        [('a', 1, 'like'), ('a', 2, 'like'), ('a', 3, 'dislike'), ('b', 1, 'dislike')],
+    )
+    conn.commit()
+    conn.close()
+
+
+def test_v1_votes_are_moved_while_bot_runs(tmp_path: Path) -> None:
+    file_name = os.path.join(tmp_path, 'like.db')
+    create_v1_database(file_name)
+    database = LikeDatabase(file_name)
+    try:
+        # post is moved on the first use, before the background thread gets to it
+        assert database.get_counts('a') == {'like': 2, 'dislike': 1}
+        assert database.add_reaction('b', 1, 'like')
+        assert database.get_counts('b') == {'like': 1}
+        for _ in range(100):
+            if not database.migrating:
+                break
+            time.sleep(0.01)
+        assert not database.migrating
+        tables = {row[0] for row in database.conn.execute('SELECT name FROM sqlite_master')}
+        assert 'like' not in tables
+        assert database.get_counts('a') == {'like': 2, 'dislike': 1}
+    finally:
+        database.close()
+
+
+def test_closed_database_continues_migration(tmp_path: Path) -> None:
+    file_name = os.path.join(tmp_path, 'like.db')
+    create_v1_database(file_name)
+    LikeDatabase(file_name).close()
+    database = LikeDatabase(file_name)
+    try:
+        assert database.get_counts('b') == {'dislike': 1}
+        assert database.check_exists('a', 3)
+    finally:
+        database.close()
+
+
+def test_v1_votes_are_moved_with_counters(tmp_path: Path) -> None:
+    file_name = os.path.join(tmp_path, 'like.db')
+    create_v1_database(file_name)
+    assert migrate_text_keys(file_name, batch_size=3) == 4
+    assert migrate_text_keys(file_name) == 0
+
+    database = LikeDatabase(file_name)
+    try:
+        assert database.get_counts('a') == {'like': 2, 'dislike': 1}
+        assert database.get_counts('b') == {'dislike': 1}
+        assert database.check_exists('a', 3)
+        # migrated posts can be voted and archived as new ones
+        assert all(created for _, created, _, _ in iter_messages(database))
+        assert database.add_reaction('a', 3, 'like')
+        assert database.get_counts('a') == {'like': 3}
+    finally:
+        database.close()
+
+
+def test_parse_reactions() -> None:
+    assert parse_reactions('like=👍, dislike = 👎') == {'like': '👍', 'dislike': '👎'}
+    for value in ('like', 'like=', '=👍', 'like=👍,like=👎'):
+        with pytest.raises(ValueError):
+            parse_reactions(value)
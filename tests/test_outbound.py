@@ -0,0 +1,120 @@
+import asyncio
+from typing import Any, Dict, List, Tuple
+
+import pytest
+from telegram.error import TelegramError
+
+from common.metrics import registry
+from common.outbound import (
+    ANSWER_PRIORITY,
+    BROADCAST_PRIORITY,
+    EDIT_PRIORITY,
+    SEND_PRIORITY,
+    PriorityRateLimiter,
+)
+
+
+def request(
+    limiter: PriorityRateLimiter, sent: List[str], name: str, priority: int, chat: Any = None
+) -> Any:
+    async def callback() -> Dict[str, Any]:
+        sent.append(name)
+        return {}
+
+    data = {} if chat is None else {'chat_id': chat}
+    return limiter.process_request(callback, (), {}, name, data, {'priority': priority})
+
+
+def test_higher_priority_is_sent_first() -> None:
+    async def scenario() -> List[str]:
+        limiter = PriorityRateLimiter(rate=100)
+        sent: List[str] = []
+        # queued before the pump runs, so it sees all of them at once
+        calls = [
+            request(limiter, sent, 'broadcast', BROADCAST_PRIORITY, 1),
+            request(limiter, sent, 'send', SEND_PRIORITY, 2),
+            request(limiter, sent, 'edit', EDIT_PRIORITY, 3),
+            request(limiter, sent, 'answer', ANSWER_PRIORITY),
+        ]
+        tasks = [asyncio.ensure_future(call) for call in calls]
+        await asyncio.sleep(0)
+        await limiter.initialize()
+        await asyncio.gather(*tasks)
+        await limiter.shutdown()
+        return sent
+
+    assert asyncio.run(scenario()) == ['answer', 'edit', 'send', 'broadcast']
+
+
+def test_messages_to_one_chat_are_paced() -> None:
+    async def scenario() -> float:
+        limiter = PriorityRateLimiter(rate=100, private_chat_interval=0.2)
+        await limiter.initialize()
+        sent: List[str] = []
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await asyncio.gather(
+            request(limiter, sent, 'first', SEND_PRIORITY, 1),
+            request(limiter, sent, 'second', SEND_PRIORITY, 1),
+        )
+        await limiter.shutdown()
+        return loop.time() - started
+
+    assert asyncio.run(scenario()) >= 0.19
+
+
+def test_shutdown_fails_waiting_and_new_requests() -> None:
+    async def scenario() -> None:
+        limiter = PriorityRateLimiter(rate=1)
+        await limiter.initialize()
+        sent: List[str] = []
+        # the only token goes to the first request, the second one waits
+        await request(limiter, sent, 'first', SEND_PRIORITY)
+        waiting = asyncio.ensure_future(request(limiter, sent, 'second', SEND_PRIORITY))
+        await asyncio.sleep(0.05)
+        await limiter.shutdown()
+        with pytest.raises(TelegramError):
+            await asyncio.wait_for(waiting, 1)
+        with pytest.raises(TelegramError):
+            await request(limiter, sent, 'third', SEND_PRIORITY)
+        assert sent == ['first']
+
+    asyncio.run(scenario())
+
+
+def test_queue_depth_is_summed_over_limiters() -> None:
+    async def scenario() -> Dict[Tuple[str, ...], float]:
+        limiters = [PriorityRateLimiter(), PriorityRateLimiter()]
+        sent: List[str] = []
+        # pumps are not started, so requests stay in the queues
+        tasks = [
+            asyncio.ensure_future(request(limiters[0], sent, 'send', SEND_PRIORITY, 1)),
+            asyncio.ensure_future(request(limiters[1], sent, 'send', SEND_PRIORITY, 2)),
+            asyncio.ensure_future(request(limiters[1], sent, 'edit', EDIT_PRIORITY, 3)),
+        ]
+        await asyncio.sleep(0)
+        depth = registry.metrics['bot_outbound_queue_depth'].collect()  # type: ignore
+        for task in tasks:
+            task.cancel()
+        return depth
+
+    depth = asyncio.run(scenario())
+    assert depth[(str(SEND_PRIORITY),)] == 2
+    assert depth[(str(EDIT_PRIORITY),)] == 1
+
+
+def test_cancelled_request_does_not_take_token() -> None:
+    async def scenario() -> float:
+        limiter = PriorityRateLimiter(rate=5)
+        # the next token comes in 0.4 s
+        limiter._bucket.pause(0.2)  # pylint: disable=protected-access
+        await limiter.initialize()
+        waiting = asyncio.ensure_future(request(limiter, [], 'send', SEND_PRIORITY))
+        await asyncio.sleep(0.05)
+        waiting.cancel()
+        await asyncio.sleep(0.5)
+        wait_time = limiter._bucket.wait_time()  # pylint: disable=protected-access
+        await limiter.shutdown()
+        return wait_time
+
+    assert asyncio.run(scenario()) == 0
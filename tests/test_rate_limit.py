@@ -0,0 +1,33 @@
+import asyncio
+from typing import List
+
+from common.rate_limit import TokenBucket
+
+
+def test_burst_then_rate() -> None:
+    async def scenario() -> List[float]:
+        loop = asyncio.get_running_loop()
+        bucket = TokenBucket(rate=50, capacity=5)
+        started = loop.time()
+        times = []
+        for _ in range(10):
+            await bucket.acquire()
+            times.append(loop.time() - started)
+        return times
+
+    times = asyncio.run(scenario())
+    # first five at once, then one per 20 ms
+    assert times[4] < 0.01
+    assert 0.09 <= times[9] < 0.2
+
+
+def test_pause_takes_tokens_away() -> None:
+    async def scenario() -> float:
+        loop = asyncio.get_running_loop()
+        bucket = TokenBucket(rate=100)
+        bucket.pause(0.1)
+        started = loop.time()
+        await bucket.acquire()
+        return loop.time() - started
+
+    assert asyncio.run(scenario()) >= 0.1
@@ -0,0 +1,53 @@
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+from likebot.analytics import DAY, archive, daily_totals
+from likebot.database import LikeDatabase
+from likebot.maintenance import is_empty
+from likebot.sharding import ShardedLikeDatabase, open_shards, reshard
+
+
+def test_reshard_copies_votes_to_empty_shards(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(LikeDatabase, 'DATABASE_FILE_NAME', os.path.join(tmp_path, 'like.db'))
+    source = ShardedLikeDatabase(open_shards(1))
+    for message in range(20):
+        source.add_reaction(f'post{message}', 1, 'like')
+        source.add_reaction(f'post{message}', 2, 'dislike')
+    source.close()
+
+    assert reshard(1, 3, batch_size=7) == 40
+    target = ShardedLikeDatabase(open_shards(3))
+    try:
+        assert not any(is_empty(shard) for shard in target.shards)
+        assert target.get_counts('post7') == {'like': 1, 'dislike': 1}
+    finally:
+        target.close()
+
+    # copying again would count every vote twice
+    with pytest.raises(ValueError):
+        reshard(1, 3)
+
+
+def test_reshard_keeps_rollups(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(LikeDatabase, 'DATABASE_FILE_NAME', os.path.join(tmp_path, 'like.db'))
+    old = int(time.time()) - 10 * DAY
+    source = open_shards(1)[0]
+    source.add_reaction('archived', 1, 'like', voted_at=old)
+    source.add_reaction('changed', 1, 'like', voted_at=old)
+    source.add_reaction('changed', 1, 'dislike')
+    assert archive(source, days=5) == 1
+    before = daily_totals([source], days=30)
+    source.close()
+
+    reshard(1, 2)
+    target = open_shards(2)
+    try:
+        assert daily_totals(target, days=30) == before
+    finally:
+        for shard in target:
+            shard.close()
@@ -0,0 +1,105 @@
+import asyncio
+from types import SimpleNamespace
+from typing import Any, List, Optional, Tuple
+
+import httpx
+import pytest
+from telegram.error import TimedOut
+
+from common.metrics import registry
+from common.transport import (
+    BOT_API_BASE_FILE_URL,
+    BOT_API_BASE_URL,
+    PoolRequest,
+    RoutingRequest,
+)
+
+URL = f'{BOT_API_BASE_URL}123456:test/getMe'
+
+
+def slow_pool(size: int, delay: float, pool_timeout: float = 5) -> PoolRequest:
+    """ Pool whose requests are answered by fake server after `delay` seconds """
+
+    async def answer(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(delay)
+        return httpx.Response(200, json={'ok': True, 'result': True})
+
+    pool = PoolRequest('api', size, timeout=1, pool_timeout=pool_timeout)
+    pool.use_transport(httpx.MockTransport(answer))
+    return pool
+
+
+def test_request_waits_for_free_slot() -> None:
+    async def scenario() -> PoolRequest:
+        pool = slow_pool(1, 0.05)
+        await pool.initialize()
+        results = await asyncio.gather(pool.do_request(URL, 'POST'), pool.do_request(URL, 'POST'))
+        assert [status for status, _ in results] == [200, 200]
+        await pool.shutdown()
+        return pool
+
+    stats = asyncio.run(scenario()).stats
+    assert stats.requests == 2
+    assert stats.waited == 1
+    assert stats.max_wait >= 0.04
+    assert stats.in_use == 0
+
+
+def test_request_times_out_when_pool_is_busy() -> None:
+    async def scenario() -> PoolRequest:
+        pool = slow_pool(1, 0.2, pool_timeout=0.01)
+        await pool.initialize()
+        first = asyncio.ensure_future(pool.do_request(URL, 'POST'))
+        await asyncio.sleep(0.01)
+        with pytest.raises(TimedOut, match='api pool'):
+            await pool.do_request(URL, 'POST')
+        assert pool.stats.in_use == 1
+        assert (await first)[0] == 200
+        await pool.shutdown()
+        return pool
+
+    stats = asyncio.run(scenario()).stats
+    # timed out request never got a slot
+    assert stats.requests == 1
+    assert stats.in_use == 0
+
+
+def test_pool_gauges_sum_live_pools() -> None:
+    first, second = PoolRequest('gauge', 1, timeout=1), PoolRequest('gauge', 1, timeout=1)
+    first.stats.in_use, second.stats.in_use = 1, 2
+    assert registry.metrics['bot_pool_in_use'].collect()[('gauge',)] == 3  # type: ignore
+
+
+class RecordingPool(PoolRequest):
+    """ Pool that answers at once and remembers requested URLs """
+
+    def __init__(self, name: str) -> None:
+        super().__init__(name, 1, timeout=1)
+        self.urls: List[str] = []
+
+    async def do_request(  # type: ignore[override]
+            self, url: str, method: str, request_data: Optional[Any] = None, **timeouts: Any
+    ) -> Tuple[int, bytes]:
+        self.urls.append(url)
+        return 200, b'{"ok": true, "result": true}'
+
+
+def test_uploads_and_downloads_go_to_media_pool() -> None:
+    api, media = RecordingPool('api'), RecordingPool('media')
+    routing = RoutingRequest(api, media)
+    upload = SimpleNamespace(multipart_data={'photo': ('photo.jpg', b'...', 'image/jpeg')})
+    plain = SimpleNamespace(multipart_data=None)
+    send_photo = f'{BOT_API_BASE_URL}123456:test/sendPhoto'
+    answer = f'{BOT_API_BASE_URL}123456:test/answerCallbackQuery'
+    download = f'{BOT_API_BASE_FILE_URL}123456:test/photos/file_1.jpg'
+
+    async def scenario() -> None:
+        await routing.do_request(send_photo, 'POST', upload)  # type: ignore[arg-type]
+        await routing.do_request(send_photo, 'POST', plain)  # type: ignore[arg-type]
+        await routing.do_request(answer, 'POST', plain)  # type: ignore[arg-type]
+        await routing.do_request(download, 'GET')
+
+    asyncio.run(scenario())
+    assert media.urls == [send_photo, download]
+    # photo sent by file_id has no attached file
+    assert api.urls == [send_photo, answer]
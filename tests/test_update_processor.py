@@ -0,0 +1,63 @@
+import asyncio
+import random
+from typing import Dict, List
+
+from telegram import Update
+
+from common.update_processor import KeyedUpdateProcessor
+
+
+def by_parity(update: Update) -> str:
+    return str(update.update_id % 2)
+
+
+def test_updates_of_one_key_are_handled_in_order() -> None:
+    async def scenario() -> Dict[str, List[int]]:
+        processor = KeyedUpdateProcessor(concurrency=8, key=by_parity)
+        handled: Dict[str, List[int]] = {'0': [], '1': []}
+
+        async def handle(update: Update) -> None:
+            await asyncio.sleep(random.uniform(0, 0.005))
+            handled[by_parity(update)].append(update.update_id)
+
+        for update_id in range(40):
+            update = Update(update_id)
+            await processor.process_update(update, handle(update))
+        await processor.shutdown()
+        return handled
+
+    handled = asyncio.run(scenario())
+    assert handled['0'] == list(range(0, 40, 2))
+    assert handled['1'] == list(range(1, 40, 2))
+
+
+def test_different_keys_are_handled_concurrently() -> None:
+    async def scenario() -> float:
+        processor = KeyedUpdateProcessor(concurrency=8, key=by_parity)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        for update_id in range(2):
+            await processor.process_update(Update(update_id), asyncio.sleep(0.2))
+        await processor.shutdown()
+        return loop.time() - started
+
+    assert asyncio.run(scenario()) < 0.35
+
+
+def test_drain_cancels_updates_left_after_timeout() -> None:
+    async def scenario() -> List[int]:
+        processor = KeyedUpdateProcessor(key=lambda update: 'same')
+        handled: List[int] = []
+
+        async def handle(update_id: int, seconds: float) -> None:
+            await asyncio.sleep(seconds)
+            handled.append(update_id)
+
+        await processor.process_update(Update(1), handle(1, 0))
+        await processor.process_update(Update(2), handle(2, 60))
+        await processor.process_update(Update(3), handle(3, 0))
+        await asyncio.wait_for(processor.drain(timeout=0.1), 1)
+        await processor.shutdown()
+        return handled
+
+    assert asyncio.run(scenario()) == [1]
@@ -0,0 +1,143 @@
+import asyncio
+import uuid
+from pathlib import Path
+from types import SimpleNamespace
+from typing import List, Optional, Set
+
+import pytest
+from telegram import InputFile, error
+
+from common.file_uploader.upload import Resource, ResourceType, upload
+
+
+class StubBot:
+    """ Records sent photos, uploads wait for `release` so concurrent sends overlap """
+
+    def __init__(self, token: str = '123456:test') -> None:
+        self.token = token
+        self.uploads = 0
+        self.sent: List[str] = []
+        self.stale: Set[str] = set()
+        self.broken = False
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def send_photo(
+            self, chat_id: int, photo: object, caption: Optional[str] = None
+    ) -> SimpleNamespace:
+        if isinstance(photo, InputFile):
+            self.uploads += 1
+            await self.release.wait()
+            if self.broken:
+                raise error.BadRequest('Wrong type of the web page content')
+            file_id = f'uploaded-{self.uploads}'
+        else:
+            if photo in self.stale:
+                raise error.BadRequest('Wrong file identifier/http url specified')
+            file_id = str(photo)
+        self.sent.append(file_id)
+        return SimpleNamespace(photo=[SimpleNamespace(file_id=file_id)])
+
+
+def picture(tmp_path: Path) -> str:
+    # unique content, so file_id cached by another test is not reused
+    path = tmp_path / 'picture.jpg'
+    path.write_bytes(uuid.uuid4().bytes)
+    return str(path)
+
+
+def test_concurrent_sends_upload_file_once(tmp_path: Path) -> None:
+    path = picture(tmp_path)
+
+    async def scenario() -> None:
+        bot = StubBot()
+        bot.release.clear()
+        sends = [
+            asyncio.create_task(upload(bot, chat, Resource(path, ResourceType.PICTURE)))
+            for chat in range(5)
+        ]
+        await asyncio.sleep(0.01)
+        bot.release.set()
+        resources = await asyncio.gather(*sends)
+        assert bot.uploads == 1
+        assert {resource.file_id for resource in resources} == {'uploaded-1'}
+        assert bot.sent == ['uploaded-1'] * 5
+
+    asyncio.run(scenario())
+
+
+def test_waiting_call_uploads_after_uploader_is_cancelled(tmp_path: Path) -> None:
+    path = picture(tmp_path)
+
+    async def scenario() -> None:
+        bot = StubBot()
+        bot.release.clear()
+        first = asyncio.create_task(upload(bot, 1, Resource(path, ResourceType.PICTURE)))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(upload(bot, 2, Resource(path, ResourceType.PICTURE)))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        await asyncio.sleep(0.01)
+        bot.release.set()
+        resource = await second
+        assert first.cancelled()
+        assert bot.uploads == 2
+        assert resource.file_id == 'uploaded-2'
+        assert bot.sent == ['uploaded-2']
+
+    asyncio.run(scenario())
+
+
+def test_upload_error_reaches_waiting_calls(tmp_path: Path) -> None:
+    path = picture(tmp_path)
+
+    async def scenario() -> None:
+        bot = StubBot()
+        bot.broken = True
+        bot.release.clear()
+        sends = [
+            asyncio.create_task(upload(bot, chat, Resource(path, ResourceType.PICTURE)))
+            for chat in range(3)
+        ]
+        await asyncio.sleep(0.01)
+        bot.release.set()
+        results = await asyncio.gather(*sends, return_exceptions=True)
+        assert bot.uploads == 1
+        assert all(str(result) == 'Not supported media resources' for result in results)
+        # failed upload is not remembered, the next send tries again
+        bot.broken = False
+        resource = await upload(bot, 1, Resource(path, ResourceType.PICTURE))
+        assert resource.file_id == 'uploaded-2'
+
+    asyncio.run(scenario())
+
+
+def test_stale_file_id_is_uploaded_once(tmp_path: Path) -> None:
+    path = picture(tmp_path)
+
+    async def scenario() -> None:
+        bot = StubBot()
+        bot.stale.add('stale')
+        bot.release.clear()
+        sends = [
+            asyncio.create_task(upload(bot, chat, Resource(path, ResourceType.PICTURE, 'stale')))
+            for chat in range(3)
+        ]
+        await asyncio.sleep(0.01)
+        bot.release.set()
+        resources = await asyncio.gather(*sends)
+        assert bot.uploads == 1
+        assert {resource.file_id for resource in resources} == {'uploaded-1'}
+        assert bot.sent == ['uploaded-1'] * 3
+
+    asyncio.run(scenario())
+
+
+def test_stale_file_id_without_path_is_an_error() -> None:
+    async def scenario() -> None:
+        bot = StubBot()
+        bot.stale.add('stale')
+        with pytest.raises(Exception, match='Not supported media resources'):
+            await upload(bot, 1, Resource('', ResourceType.PICTURE, 'stale'))
+
+    asyncio.run(scenario())
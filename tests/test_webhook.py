@@ -0,0 +1,11 @@
+import pytest
+
+from common import webhook
+
+
+def test_webhook_needs_secret_token(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(webhook, 'WEBHOOK_SECRET_TOKEN', None)
+    with pytest.raises(RuntimeError):
+        webhook.secret_token()
+    monkeypatch.setattr(webhook, 'WEBHOOK_SECRET_TOKEN', 'secret')
+    assert webhook.secret_token() == 'secret'